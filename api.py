@@ -0,0 +1,342 @@
+"""JSON API /api/v1 для мобильного приложения и интеграций.
+
+Доступ - по токену в заголовке Authorization: Bearer (выдает POST /api/v1/token).
+Ответы сериализуются orjson. Списки поддерживают:
+
+- fields=id,title,... - только перечисленные поля (id возвращается всегда); связи,
+  которые не запрошены, не загружаются из БД;
+- cursor/limit - страницы по ключу (created_at, id) от новых к старым, как на страницах
+  деканата; next_cursor равен null на последней странице;
+- ETag/If-None-Match - если ответ не изменился, клиент получает 304 без тела.
+"""
+from fastapi import APIRouter, Depends, Form, HTTPException, Request
+from fastapi.responses import ORJSONResponse, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from database import get_db
+from models import *
+from auth import (
+    ACCESS_TOKEN_EXPIRE_MINUTES, authenticate_user, create_access_token, get_current_user,
+    remember_user, user_claims
+)
+from pagination import keyset_page
+from datetime import datetime, timedelta
+from typing import Optional
+import hashlib
+import orjson
+
+API_PREFIX = "/api/v1"
+
+router = APIRouter(prefix=API_PREFIX, tags=["api"], default_response_class=ORJSONResponse)
+
+
+def dumps(payload) -> bytes:
+    """JSON ответов API и событий /events; datetime - в ISO 8601."""
+    return orjson.dumps(payload)
+
+
+def is_api_request(request: Request) -> bool:
+    return request.url.path.startswith(API_PREFIX + "/")
+
+
+def api_error(status_code: int, detail, headers: dict = None) -> Response:
+    """Ошибка API в JSON, как у FastAPI по умолчанию, вместо страницы error.html."""
+    return Response(dumps({"detail": detail}), status_code=status_code, headers=headers, media_type="application/json")
+
+
+def api_response(request: Request, payload) -> Response:
+    """JSON-ответ с ETag по содержимому; при совпадении If-None-Match - 304 без тела."""
+    body = dumps(payload)
+    etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Authorization"}
+    if_none_match = request.headers.get("if-none-match", "")
+    # Сжатый ответ уходит со слабым ETag (см. compression.py), сравнение - слабое
+    if etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(body, headers=headers, media_type="application/json")
+
+
+def select_fields(fields: Optional[str], available: dict) -> list:
+    """Поля ответа из параметра fields; без него - все доступные."""
+    if not fields:
+        return list(available)
+    selected = ["id"]
+    for name in fields.split(","):
+        name = name.strip()
+        if not name or name in selected:
+            continue
+        if name not in available:
+            raise HTTPException(status_code=400, detail=f"Unknown field: {name}")
+        selected.append(name)
+    return selected
+
+
+def serialize(items, selected: list, available: dict) -> list:
+    return [{name: available[name](item) for name in selected} for item in items]
+
+
+def _user_brief(user):
+    if user is None:
+        return None
+    return {"id": user.id, "username": user.username, "full_name": user.full_name}
+
+
+def _page(items, selected: list, available: dict, next_cursor: Optional[str]) -> dict:
+    return {"items": serialize(items, selected, available), "next_cursor": next_cursor}
+
+
+ME_FIELDS = {
+    "id": lambda user: user.id,
+    "username": lambda user: user.username,
+    "email": lambda user: user.email,
+    "full_name": lambda user: user.full_name,
+    "role": lambda user: user.role,
+}
+
+SCHEDULE_FIELDS = {
+    "id": lambda item: item.id,
+    "subject": lambda item: item.subject,
+    "day_of_week": lambda item: item.day_of_week,
+    "time_start": lambda item: item.time_start,
+    "time_end": lambda item: item.time_end,
+    "room": lambda item: item.room,
+    "teacher_name": lambda item: item.teacher_name,
+}
+
+NEWS_FIELDS = {
+    "id": lambda item: item.id,
+    "title": lambda item: item.title,
+    "description": lambda item: item.description,
+    "photo_path": lambda item: item.photo_path,
+    "photo_variants": lambda item: item.photo_variants,
+    "author": lambda item: _user_brief(item.author),
+    "created_at": lambda item: item.created_at,
+    "approved_at": lambda item: item.approved_at,
+}
+
+DOCUMENT_FIELDS = {
+    "id": lambda item: item.id,
+    "document_type": lambda item: item.document_type,
+    "description": lambda item: item.description,
+    "status": lambda item: item.status,
+    "user_id": lambda item: item.user_id,
+    "user": lambda item: _user_brief(item.user),
+    "created_at": lambda item: item.created_at,
+    "processed_at": lambda item: item.processed_at,
+}
+
+DORMITORY_REQUEST_FIELDS = {
+    "id": lambda item: item.id,
+    "request_type": lambda item: item.request_type,
+    "description": lambda item: item.description,
+    "status": lambda item: item.status,
+    "user_id": lambda item: item.user_id,
+    "user": lambda item: _user_brief(item.user),
+    "created_at": lambda item: item.created_at,
+    "processed_at": lambda item: item.processed_at,
+}
+
+GROUP_FIELDS = {
+    "id": lambda group: group.id,
+    "name": lambda group: group.name,
+    "teacher_id": lambda group: group.teacher_id,
+    "created_at": lambda group: group.created_at,
+}
+# Состав группы видят только преподаватели и деканат
+GROUP_FIELDS_WITH_STUDENTS = {
+    **GROUP_FIELDS,
+    "students": lambda group: [_user_brief(member.student) for member in group.students],
+}
+
+ATTENDANCE_FIELDS = {
+    "id": lambda record: record.id,
+    "student_id": lambda record: record.student_id,
+    "student": lambda record: _user_brief(record.student),
+    "date": lambda record: record.date,
+    "present": lambda record: record.present,
+    "notes": lambda record: record.notes,
+    "created_at": lambda record: record.created_at,
+}
+
+# ========== ТОКЕН ==========
+
+@router.post("/token")
+async def issue_token(
+    username: str = Form(...),
+    password: str = Form(...),
+    db: AsyncSession = Depends(get_db)
+):
+    """Токен по логину и паролю (форма OAuth2 password: username, password)."""
+    user = await authenticate_user(db, username, password)
+    if not user:
+        raise HTTPException(
+            status_code=401,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    remember_user(user)
+    expires_delta = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    return {
+        "access_token": create_access_token(data=user_claims(user), expires_delta=expires_delta),
+        "token_type": "bearer",
+        "expires_in": int(expires_delta.total_seconds()),
+    }
+
+
+@router.get("/me")
+async def me(request: Request, fields: Optional[str] = None, user=Depends(get_current_user)):
+    selected = select_fields(fields, ME_FIELDS)
+    return api_response(request, serialize([user], selected, ME_FIELDS)[0])
+
+# ========== РАСПИСАНИЕ И НОВОСТИ ==========
+
+@router.get("/schedule")
+async def schedule(
+    request: Request,
+    fields: Optional[str] = None,
+    day: Optional[str] = None,
+    user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    selected = select_fields(fields, SCHEDULE_FIELDS)
+    stmt = select(Schedule).order_by(Schedule.day_index, Schedule.start_minute)
+    if day:
+        if day not in DAYS_OF_WEEK:
+            raise HTTPException(status_code=400, detail="Unknown day")
+        stmt = stmt.where(Schedule.day_index == DAYS_OF_WEEK.index(day))
+    items = (await db.scalars(stmt)).all()
+    # Расписание на неделю невелико и отдается целиком
+    return api_response(request, {"items": serialize(items, selected, SCHEDULE_FIELDS)})
+
+
+@router.get("/news")
+async def news(
+    request: Request,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    selected = select_fields(fields, NEWS_FIELDS)
+    stmt = select(News).where(News.status == "approved")
+    if "author" in selected:
+        stmt = stmt.options(joinedload(News.author))
+    items, next_cursor = await keyset_page(db, stmt, News, cursor, limit)
+    return api_response(request, _page(items, selected, NEWS_FIELDS, next_cursor))
+
+# ========== ЗАЯВКИ ==========
+
+async def _requests_page(request, db, user, model, available, statuses, status, fields, cursor, limit):
+    """Заявки пользователя; деканату - заявки всех пользователей с фильтром по статусу."""
+    selected = select_fields(fields, available)
+    if status and status not in statuses:
+        raise HTTPException(status_code=400, detail="Unknown status")
+    stmt = select(model)
+    if user.role != "deanery":
+        stmt = stmt.where(model.user_id == user.id)
+    if status:
+        stmt = stmt.where(model.status == status)
+    if "user" in selected:
+        stmt = stmt.options(joinedload(model.user))
+    items, next_cursor = await keyset_page(db, stmt, model, cursor, limit)
+    return api_response(request, _page(items, selected, available, next_cursor))
+
+
+@router.get("/documents")
+async def documents(
+    request: Request,
+    status: Optional[str] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    return await _requests_page(
+        request, db, user, Document, DOCUMENT_FIELDS, DOCUMENT_STATUSES, status, fields, cursor, limit
+    )
+
+
+@router.get("/dormitory-requests")
+async def dormitory_requests(
+    request: Request,
+    status: Optional[str] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    return await _requests_page(
+        request, db, user, DormitoryRequest, DORMITORY_REQUEST_FIELDS, DORMITORY_REQUEST_STATUSES,
+        status, fields, cursor, limit
+    )
+
+# ========== ГРУППЫ И ПОСЕЩАЕМОСТЬ ==========
+
+@router.get("/groups")
+async def groups(
+    request: Request,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Группы преподавателя, группы студента или все группы для деканата."""
+    available = GROUP_FIELDS if user.role == "student" else GROUP_FIELDS_WITH_STUDENTS
+    selected = select_fields(fields, available)
+    stmt = select(Group)
+    if user.role == "teacher":
+        stmt = stmt.where(Group.teacher_id == user.id)
+    elif user.role == "student":
+        stmt = stmt.where(Group.id.in_(select(GroupStudent.group_id).where(GroupStudent.student_id == user.id)))
+    if "students" in selected:
+        stmt = stmt.options(selectinload(Group.students).joinedload(GroupStudent.student))
+    items, next_cursor = await keyset_page(db, stmt, Group, cursor, limit)
+    return api_response(request, _page(items, selected, available, next_cursor))
+
+
+@router.get("/groups/{group_id}/attendance")
+async def group_attendance(
+    request: Request,
+    group_id: int,
+    date: Optional[str] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Отметки посещаемости группы; студент видит только свои."""
+    selected = select_fields(fields, ATTENDANCE_FIELDS)
+    group = await db.get(Group, group_id)
+    if not group:
+        raise HTTPException(status_code=404, detail="Group not found")
+    if user.role == "teacher" and group.teacher_id != user.id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    if user.role == "student":
+        member = await db.scalar(
+            select(GroupStudent.id).where(
+                GroupStudent.group_id == group_id,
+                GroupStudent.student_id == user.id
+            )
+        )
+        if member is None:
+            raise HTTPException(status_code=403, detail="Access denied")
+
+    stmt = select(AttendanceRecord).where(AttendanceRecord.group_id == group_id)
+    if user.role == "student":
+        stmt = stmt.where(AttendanceRecord.student_id == user.id)
+    if date:
+        try:
+            day = datetime.strptime(date, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date")
+        stmt = stmt.where(AttendanceRecord.date >= day, AttendanceRecord.date < day + timedelta(days=1))
+    if "student" in selected:
+        stmt = stmt.options(joinedload(AttendanceRecord.student))
+    items, next_cursor = await keyset_page(db, stmt, AttendanceRecord, cursor, limit)
+    return api_response(request, _page(items, selected, ATTENDANCE_FIELDS, next_cursor))
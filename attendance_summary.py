@@ -0,0 +1,208 @@
+from sqlalchemy import select, insert, update, delete, func, case, and_, or_, bindparam, DateTime
+from collections import defaultdict
+from models import AttendanceRecord, StudentAttendanceSummary, GroupAttendanceSummary
+
+attendance_table = AttendanceRecord.__table__
+student_table = StudentAttendanceSummary.__table__
+group_table = GroupAttendanceSummary.__table__
+
+
+def _dialect_insert(dialect_name: str, table):
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(table)
+
+
+def _insert_ignore(dialect_name: str, table):
+    return _dialect_insert(dialect_name, table).on_conflict_do_nothing()
+
+
+ATTENDANCE_KEY = ["group_id", "student_id", "date"]
+
+
+async def upsert_attendance(db, group_id: int, date, marks: dict):
+    """Записывает отметки {student_id: (present, notes)} за одно занятие и обновляет сводные таблицы.
+
+    Запись идет тремя INSERT ... ON CONFLICT по уникальному ключу (группа, студент, дата):
+    новые отметки, смена present, смена notes. Изменения для сводок берутся из строк,
+    которые вернул RETURNING, а не из прочитанных заранее, поэтому повторная или
+    параллельная отправка того же списка не создает дублей и не считает занятие дважды.
+    """
+    if not marks:
+        return
+    dialect_name = db.get_bind().dialect.name
+    rows = [
+        {"group_id": group_id, "student_id": student_id, "date": date, "present": present, "notes": notes}
+        for student_id, (present, notes) in marks.items()
+    ]
+
+    statement = _insert_ignore(dialect_name, attendance_table).values(rows)
+    inserted = set((await db.execute(statement.returning(attendance_table.c.student_id))).scalars().all())
+
+    statement = _dialect_insert(dialect_name, attendance_table).values(rows)
+    flipped = (await db.execute(
+        statement.on_conflict_do_update(
+            index_elements=ATTENDANCE_KEY,
+            set_={"present": statement.excluded.present, "notes": statement.excluded.notes},
+            # Сводки считают NULL отсутствием, как и здесь
+            where=func.coalesce(attendance_table.c.present, False) != statement.excluded.present
+        ).returning(attendance_table.c.student_id, attendance_table.c.present)
+    )).all()
+
+    statement = _dialect_insert(dialect_name, attendance_table).values(rows)
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=ATTENDANCE_KEY,
+        set_={"notes": statement.excluded.notes},
+        where=attendance_table.c.notes.is_distinct_from(statement.excluded.notes)
+    ))
+
+    changes = [(group_id, student_id, date, None, marks[student_id][0]) for student_id in inserted]
+    # present логический: строка, которую изменил второй запрос, раньше имела противоположное значение
+    changes += [
+        (group_id, student_id, date, not present, present)
+        for student_id, present in flipped if student_id not in inserted
+    ]
+    await apply_attendance_changes(db, changes)
+
+
+def _later(column, seen):
+    return case(
+        (and_(seen.is_not(None), or_(column.is_(None), column < seen)), seen),
+        else_=column
+    )
+
+
+def _collect_deltas(changes):
+    students = defaultdict(lambda: {"sessions": 0, "presents": 0, "seen": None, "recheck": False})
+    groups = defaultdict(lambda: {"sessions": 0, "presents": 0, "seen": None, "recheck": False})
+    for group_id, student_id, date, old_present, new_present in changes:
+        for delta in (students[(group_id, student_id)], groups[group_id]):
+            if old_present is None:
+                delta["sessions"] += 1
+            delta["presents"] += int(bool(new_present)) - int(bool(old_present))
+            if new_present and (delta["seen"] is None or date > delta["seen"]):
+                delta["seen"] = date
+            if old_present and not new_present:
+                delta["recheck"] = True
+    return students, groups
+
+
+async def apply_attendance_changes(db, changes):
+    """Переносит изменения посещаемости в сводные таблицы в текущей транзакции.
+
+    changes - последовательность (group_id, student_id, date, old_present, new_present),
+    где old_present равен None для новой записи. Счетчики увеличиваются атомарным UPDATE,
+    поэтому параллельные записи не теряют друг друга.
+    """
+    students, groups = _collect_deltas(changes)
+    if not students:
+        return
+    dialect_name = db.get_bind().dialect.name
+    seen = bindparam("seen", type_=DateTime)
+    present_dates = attendance_table.c.present == True
+
+    await db.execute(_insert_ignore(dialect_name, student_table), [
+        {"group_id": group_id, "student_id": student_id, "sessions": 0, "presents": 0}
+        for group_id, student_id in students
+    ])
+    await db.execute(
+        update(student_table).where(
+            student_table.c.group_id == bindparam("g_id"),
+            student_table.c.student_id == bindparam("s_id")
+        ).values(
+            sessions=student_table.c.sessions + bindparam("d_sessions"),
+            presents=student_table.c.presents + bindparam("d_presents"),
+            last_seen=_later(student_table.c.last_seen, seen)
+        ),
+        [
+            {"g_id": group_id, "s_id": student_id, "d_sessions": delta["sessions"],
+             "d_presents": delta["presents"], "seen": delta["seen"]}
+            for (group_id, student_id), delta in students.items()
+        ]
+    )
+
+    await db.execute(_insert_ignore(dialect_name, group_table), [
+        {"group_id": group_id, "sessions": 0, "presents": 0} for group_id in groups
+    ])
+    await db.execute(
+        update(group_table).where(group_table.c.group_id == bindparam("g_id")).values(
+            sessions=group_table.c.sessions + bindparam("d_sessions"),
+            presents=group_table.c.presents + bindparam("d_presents"),
+            last_seen=_later(group_table.c.last_seen, seen)
+        ),
+        [
+            {"g_id": group_id, "d_sessions": delta["sessions"],
+             "d_presents": delta["presents"], "seen": delta["seen"]}
+            for group_id, delta in groups.items()
+        ]
+    )
+
+    # Если отметку "присутствовал" сняли, последнее посещение пересчитывается по записям
+    recheck_students = [
+        {"g_id": group_id, "s_id": student_id}
+        for (group_id, student_id), delta in students.items() if delta["recheck"]
+    ]
+    if recheck_students:
+        latest = select(func.max(attendance_table.c.date)).where(
+            attendance_table.c.group_id == student_table.c.group_id,
+            attendance_table.c.student_id == student_table.c.student_id,
+            present_dates
+        ).scalar_subquery()
+        await db.execute(
+            update(student_table).where(
+                student_table.c.group_id == bindparam("g_id"),
+                student_table.c.student_id == bindparam("s_id")
+            ).values(last_seen=latest),
+            recheck_students
+        )
+    recheck_groups = [{"g_id": group_id} for group_id, delta in groups.items() if delta["recheck"]]
+    if recheck_groups:
+        latest = select(func.max(attendance_table.c.date)).where(
+            attendance_table.c.group_id == group_table.c.group_id,
+            present_dates
+        ).scalar_subquery()
+        await db.execute(
+            update(group_table).where(group_table.c.group_id == bindparam("g_id")).values(last_seen=latest),
+            recheck_groups
+        )
+
+
+def rebuild_attendance_summaries(db):
+    """Полностью пересчитывает сводные таблицы по attendance_records (синхронная сессия)."""
+    refill_attendance_summaries(db)
+    db.commit()
+
+
+def refill_attendance_summaries(connection):
+    """То же, что rebuild_attendance_summaries, но внутри уже открытой транзакции."""
+    presents = func.sum(case((attendance_table.c.present == True, 1), else_=0))
+    last_seen = func.max(case((attendance_table.c.present == True, attendance_table.c.date)))
+
+    connection.execute(delete(student_table))
+    connection.execute(delete(group_table))
+    connection.execute(insert(student_table).from_select(
+        ["group_id", "student_id", "sessions", "presents", "last_seen"],
+        select(
+            attendance_table.c.group_id, attendance_table.c.student_id,
+            func.count(), presents, last_seen
+        ).group_by(attendance_table.c.group_id, attendance_table.c.student_id)
+    ))
+    connection.execute(insert(group_table).from_select(
+        ["group_id", "sessions", "presents", "last_seen"],
+        select(
+            attendance_table.c.group_id, func.count(), presents, last_seen
+        ).group_by(attendance_table.c.group_id)
+    ))
+
+
+if __name__ == "__main__":
+    from database import SessionLocal, init_db
+    init_db()
+    db = SessionLocal()
+    try:
+        rebuild_attendance_summaries(db)
+        print("Сводные таблицы посещаемости пересчитаны.")
+    finally:
+        db.close()
@@ -1,19 +1,104 @@
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import User
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from database import get_db
+from hashing import hash_pool, HashPoolSaturated
+from collections import OrderedDict
+from dataclasses import dataclass
+import threading
+import time
 import os
 
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30 days
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+# claims - пользователь берется из токена и кэша процесса, db - из БД на каждый запрос
+AUTH_MODE = os.getenv("AUTH_MODE", "claims")
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "60"))  # seconds
+# При увеличении числа раундов хеши пересчитываются при следующем входе пользователя
+PBKDF2_ROUNDS = int(os.getenv("PBKDF2_ROUNDS", "29000"))
+
+# min_rounds помечает хеши с меньшим числом раундов как устаревшие (verify_and_update
+# возвращает новый хеш); одного default_rounds для этого недостаточно
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__default_rounds=PBKDF2_ROUNDS,
+    pbkdf2_sha256__min_rounds=PBKDF2_ROUNDS
+)
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/token")
+
+class TTLCache:
+    """Ограниченный LRU-кэш, записи которого устаревают через ttl секунд."""
+
+    def __init__(self, maxsize: int, ttl: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """Неизменяемая копия пользователя, которую можно держать в кэше между сессиями."""
+    id: int
+    username: str
+    email: str
+    full_name: str
+    role: str
+    is_active: bool
+    token_version: int
+
+    @classmethod
+    def from_user(cls, user: User):
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            full_name=user.full_name,
+            role=user.role,
+            is_active=user.is_active is not False,
+            token_version=user.token_version or 0
+        )
+
+# Кэши локальны для процесса: смена версии в другом воркере станет видна здесь
+# не позже чем через AUTH_CACHE_TTL секунд.
+token_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+user_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -21,6 +106,12 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+def verify_and_update_password(plain_password, hashed_password):
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await hash_pool.run(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     if expires_delta:
@@ -31,34 +122,92 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_user_by_username(db: Session, username: str):
-    return db.query(User).filter(User.username == username).first()
+def user_claims(user):
+    return {
+        "sub": user.username,
+        "uid": user.id,
+        "role": user.role,
+        "ver": user.token_version or 0
+    }
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(User).filter(User.email == email).first()
+def decode_access_token(token: str):
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if claims.get("sub") is None:
+        return None
+    token_cache.set(token, claims, ttl=claims.get("exp", 0) - time.time())
+    return claims
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = get_user_by_username(db, username)
+def remember_user(user: User):
+    snapshot = UserSnapshot.from_user(user)
+    user_cache.set(user.id, snapshot)
+    return snapshot
+
+def invalidate_user(user_id: int):
+    user_cache.pop(user_id)
+
+async def bump_token_version(db: AsyncSession, user_id: int):
+    """Отзывает все выданные пользователю токены (смена роли, блокировка, выход)."""
+    await db.execute(
+        update(User).where(User.id == user_id).values(token_version=User.token_version + 1)
+    )
+    await db.commit()
+    invalidate_user(user_id)
+
+async def get_user_by_username(db: AsyncSession, username: str):
+    return await db.scalar(select(User).where(User.username == username))
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    return await db.scalar(select(User).where(User.email == email))
+
+async def get_user_from_token(db: AsyncSession, token: str):
+    claims = decode_access_token(token)
+    if claims is None:
+        return None
+
+    # Токены, выданные до появления версий, считаются версией 0 и отзываются первым же bump_token_version
+    version = claims.get("ver", 0)
+    user_id = claims.get("uid")
+    if AUTH_MODE != "claims" or user_id is None:
+        user = await get_user_by_username(db, username=claims["sub"])
+        if user is None or user.is_active is False or (user.token_version or 0) != version:
+            return None
+        return user
+
+    snapshot = user_cache.get(user_id)
+    if snapshot is None:
+        user = await db.get(User, user_id)
+        if user is None:
+            return None
+        snapshot = remember_user(user)
+    if not snapshot.is_active or snapshot.token_version != version:
+        return None
+    return snapshot
+
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = await get_user_by_username(db, username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = await hash_pool.run(verify_and_update_password, password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    user = get_user_by_username(db, username=username)
+    user = await get_user_from_token(db, token)
     if user is None:
         raise credentials_exception
     return user
@@ -72,4 +221,3 @@ def require_role(allowed_roles: list):
             )
         return current_user
     return role_checker
-
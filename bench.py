@@ -0,0 +1,317 @@
+"""Нагрузочный бенчмарк маршрутов приложения.
+
+Приложение запускается в этом же процессе (httpx + ASGITransport) на копии
+заполненной базы нагрузочного объема; каждый маршрут прогоняется отдельно
+с заданной параллельностью.
+
+    python bench.py                                  # база создается во временном каталоге
+    python bench.py --db bench.db --build            # собрать базу один раз и переиспользовать
+    python bench.py --db bench.db --output results.json
+    python bench.py --db bench.db --baseline baseline.json   # код возврата 1 при регрессии
+
+Для каждого маршрута считаются p50/p95/p99, пропускная способность, ошибки
+и число SQL-запросов на запрос. Зависимости: requirements-dev.txt.
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+SCALE_DEFAULTS = {
+    "students": 5000, "teachers": 200, "groups": 200, "weeks": 16,
+    "news": 2000, "documents": 5000, "dormitory": 5000,
+}
+
+_query_counter = contextvars.ContextVar("bench_query_counter", default=None)
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def configure_environment(db_path):
+    """Настраивает приложение до его импорта: модули читают окружение при загрузке."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    os.environ["SEED_ON_STARTUP"] = "0"
+    os.environ["AUTO_MIGRATE"] = "0"
+
+
+def build_database(db_path, scale, seed):
+    """Создает и заполняет базу отдельным процессом, чтобы не загружать приложение дважды."""
+    import subprocess
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}")
+    env.pop("ASYNC_DATABASE_URL", None)
+    here = os.path.dirname(os.path.abspath(__file__))
+    subprocess.run([sys.executable, os.path.join(here, "migrate.py")], env=env, cwd=here, check=True)
+    args = [sys.executable, os.path.join(here, "fill_data.py"), "--scale", "--seed", str(seed)]
+    for name, value in scale.items():
+        args += [f"--{name}", str(value)]
+    subprocess.run(args, env=env, cwd=here, check=True)
+
+
+def load_fixtures(engine, rng):
+    """Выбирает из базы группу преподавателя teacher_1 и ее студентов."""
+    from sqlalchemy import select
+    from models import User, Group, GroupStudent
+    with engine.connect() as connection:
+        teacher_id = connection.execute(select(User.id).where(User.username == "teacher_1")).scalar()
+        group_ids = connection.execute(
+            select(Group.id).where(Group.teacher_id == teacher_id).order_by(Group.id)
+        ).scalars().all()
+        if not group_ids:
+            raise SystemExit("В базе нет синтетических данных: пересоберите ее с --build")
+        group_id = rng.choice(group_ids)
+        student_ids = connection.execute(
+            select(GroupStudent.student_id).where(GroupStudent.group_id == group_id).order_by(GroupStudent.student_id)
+        ).scalars().all()
+    return {"group_id": group_id, "student_ids": student_ids}
+
+
+# Начала фамилий из fill_data.py и логинов, как их набирает преподаватель
+SEARCH_PREFIXES = ["и", "пет", "смирн", "кузнецов", "student_1", "нов", "соколов а", "student_42"]
+# Запросы к поиску новостей: частое слово, редкое сочетание и слово, которого нет
+NEWS_QUERIES = ["новость", "программирование аудитория", "расписании", "общежитие ремонт"]
+
+def scenarios(fixtures):
+    """Маршруты бенчмарка: имя -> (роль клиента, функция, строящая запрос по номеру)."""
+    group_id = fixtures["group_id"]
+    student_ids = fixtures["student_ids"]
+    # Отметки ставятся в будущем, чтобы не пересекаться с данными семестра
+    base_date = datetime.utcnow().replace(second=0, microsecond=0) + timedelta(days=365)
+
+    def mark(n):
+        date = base_date + timedelta(minutes=n)
+        return "POST", "/teacher/attendance", {
+            "group_id": group_id, "student_id": student_ids[n % len(student_ids)],
+            "date": date.strftime("%Y-%m-%d %H:%M"), "present": "true"
+        }
+
+    def roster(n):
+        # Каждое второе занятие отправляется повторно: половина запросов - обновление отметок
+        date = base_date + timedelta(days=1, hours=n // 2)
+        data = {"date": date.strftime("%Y-%m-%d %H:%M"), "student_ids": [str(s) for s in student_ids]}
+        for student_id in student_ids:
+            if (student_id + n) % 7:
+                data[f"present_{student_id}"] = "on"
+        return "POST", f"/teacher/group/{group_id}/attendance", data
+
+    return {
+        "login": ("anonymous", lambda n: ("POST", "/login", {"username": f"student_{n % 100 + 1}", "password": "student123"})),
+        "dashboard": ("student", lambda n: ("GET", "/dashboard", None)),
+        "schedule": ("student", lambda n: ("GET", "/schedule", None)),
+        "news": ("student", lambda n: ("GET", "/news", None)),
+        "news_feed": ("student", lambda n: ("GET", "/news/feed", None)),
+        "news_search": ("student", lambda n: ("GET", f"/news/search?q={quote(NEWS_QUERIES[n % len(NEWS_QUERIES)])}", None)),
+        "dormitory_admin": ("deanery", lambda n: ("GET", "/dormitory/admin", None)),
+        "documents_admin": ("deanery", lambda n: ("GET", "/documents/admin", None)),
+        "news_admin": ("deanery", lambda n: ("GET", "/news/admin", None)),
+        "attendance_report": ("deanery", lambda n: ("GET", "/attendance/report", None)),
+        "teacher": ("teacher", lambda n: ("GET", "/teacher", None)),
+        "group_detail": ("teacher", lambda n: ("GET", f"/teacher/group/{group_id}", None)),
+        "student_search": ("teacher", lambda n: ("GET", f"/users/search?q={quote(SEARCH_PREFIXES[n % len(SEARCH_PREFIXES)])}&group_id={group_id}", None)),
+        "attendance_mark": ("teacher", mark),
+        "attendance_roster": ("teacher", roster),
+    }
+
+
+CREDENTIALS = {
+    "student": ("student_1", "student123"),
+    "teacher": ("teacher_1", "teacher123"),
+    "deanery": ("admin", "admin123"),
+}
+
+
+async def run_route(client, build_request, total, concurrency, offset):
+    latencies, statuses, queries = [], {}, []
+    counter = iter(range(offset, offset + total))
+
+    async def worker():
+        for n in counter:
+            method, url, data = build_request(n)
+            query_count = [0]
+            token = _query_counter.set(query_count)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, data=data)
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+            finally:
+                _query_counter.reset(token)
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+            queries.append(query_count[0])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if not isinstance(status, int) or status >= 400)
+    return {
+        "requests": total,
+        "errors": errors,
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        "throughput_rps": round(total / elapsed, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "queries_per_request": round(sum(queries) / len(queries), 2),
+        "max_queries": max(queries),
+    }
+
+
+async def run_benchmark(args, fixtures):
+    import httpx
+    from sqlalchemy import event
+    import database
+    from main import app
+
+    event.listen(database.async_engine.sync_engine, "before_cursor_execute", _count_query)
+    selected = scenarios(fixtures)
+    if args.routes:
+        unknown = set(args.routes) - set(selected)
+        if unknown:
+            raise SystemExit(f"Неизвестные маршруты: {', '.join(sorted(unknown))}")
+        selected = {name: selected[name] for name in args.routes}
+
+    await app.router.startup()
+    clients = {}
+    try:
+        transport = httpx.ASGITransport(app=app)
+        for role in ["anonymous", *CREDENTIALS]:
+            clients[role] = httpx.AsyncClient(transport=transport, base_url="http://testserver", timeout=60)
+            if role in CREDENTIALS:
+                username, password = CREDENTIALS[role]
+                response = await clients[role].post("/login", data={"username": username, "password": password})
+                if response.status_code != 303:
+                    raise SystemExit(f"Не удалось войти как {username}: {response.status_code}")
+
+        results = {}
+        for name, (role, build_request) in selected.items():
+            if args.warmup:
+                await run_route(clients[role], build_request, args.warmup, args.concurrency, offset=0)
+            results[name] = await run_route(
+                clients[role], build_request, args.requests, args.concurrency, offset=args.warmup
+            )
+            result = results[name]
+            print(
+                f"{name:<20} p50 {result['p50_ms']:>8.2f} ms  p95 {result['p95_ms']:>8.2f} ms  "
+                f"p99 {result['p99_ms']:>8.2f} ms  {result['throughput_rps']:>8.1f} rps  "
+                f"SQL/запрос {result['queries_per_request']:>5.2f}  ошибки {result['errors']}"
+            )
+        return results
+    finally:
+        for client in clients.values():
+            await client.aclose()
+        await app.router.shutdown()
+        event.remove(database.async_engine.sync_engine, "before_cursor_execute", _count_query)
+
+
+def compare(results, baseline, threshold):
+    """Сравнивает с сохраненным прогоном; возвращает список регрессий."""
+    regressions = []
+    for name, result in results["routes"].items():
+        base = baseline.get("routes", {}).get(name)
+        if not base:
+            continue
+        for metric in ("p95_ms", "p99_ms"):
+            if result[metric] > base[metric] * (1 + threshold):
+                regressions.append(f"{name}: {metric} {base[metric]} -> {result[metric]}")
+        if result["queries_per_request"] > base["queries_per_request"]:
+            regressions.append(
+                f"{name}: SQL/запрос {base['queries_per_request']} -> {result['queries_per_request']}"
+            )
+        if result["errors"] > base["errors"]:
+            regressions.append(f"{name}: ошибки {base['errors']} -> {result['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный бенчмарк маршрутов MAX UNIVER")
+    parser.add_argument("--db", help="заполненная база-шаблон; прогон идет на ее копии")
+    parser.add_argument("--build", action="store_true", help="(пере)создать базу --db перед прогоном")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=200, help="запросов на маршрут")
+    parser.add_argument("--warmup", type=int, default=20, help="прогревочных запросов на маршрут")
+    parser.add_argument("--routes", nargs="+", help="прогнать только указанные маршруты")
+    parser.add_argument("--output", help="записать результаты в JSON")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.25, help="допустимый рост p95/p99 (доля)")
+    parser.add_argument("--seed", type=int, default=1)
+    for name, value in SCALE_DEFAULTS.items():
+        parser.add_argument(f"--{name}", type=int, default=value)
+    args = parser.parse_args()
+    scale = {name: getattr(args, name) for name in SCALE_DEFAULTS}
+
+    workdir = tempfile.mkdtemp(prefix="max_univer_bench_")
+    try:
+        template = os.path.abspath(args.db) if args.db else os.path.join(workdir, "template.db")
+        if args.build or not os.path.exists(template):
+            print(f"Заполнение базы {template}...")
+            build_database(template, scale, args.seed)
+        db_path = os.path.join(workdir, "bench.db")
+        shutil.copyfile(template, db_path)
+
+        configure_environment(db_path)
+        import database
+        fixtures = load_fixtures(database.engine, random.Random(args.seed))
+        routes = asyncio.run(run_benchmark(args, fixtures))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": args.db or "temporary",
+            "scale": scale,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+        },
+        "routes": routes,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Результаты записаны в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("Регрессии относительно базового прогона:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("Регрессий относительно базового прогона нет.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Замер холодного старта: от запуска процесса до первого успешного ответа."""
+import os
+import time
+
+def _process_age() -> float:
+    """Сколько секунд назад запущен процесс (по /proc); 0, если узнать нельзя."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Имя процесса в скобках может содержать пробелы; starttime - 22-е поле
+            fields = f.read().rsplit(")", 1)[1].split()
+        started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+        return max(0.0, time.clock_gettime(time.CLOCK_BOOTTIME) - started)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0.0
+
+class BootTimer:
+    """Длительность этапов запуска; итог печатается после первого успешного ответа."""
+
+    def __init__(self):
+        self.started = time.monotonic() - _process_age()
+        self.stages = []
+        self._last = self.started
+        self.first_response = None
+
+    def mark(self, stage: str):
+        now = time.monotonic()
+        self.stages.append((stage, now - self._last))
+        self._last = now
+
+    def report(self) -> str:
+        stages = ", ".join(f"{stage} {seconds * 1000:.0f} мс" for stage, seconds in self.stages)
+        return f"Запуск: {stages}; готов через {(self._last - self.started) * 1000:.0f} мс после старта процесса"
+
+    def response_sent(self, path: str):
+        self.first_response = time.monotonic() - self.started
+        print(f"Первый успешный ответ ({path}) через {self.first_response * 1000:.0f} мс после старта процесса")
+
+boot_timer = BootTimer()
+
+class FirstResponseMiddleware:
+    """Отмечает первый ответ со статусом меньше 400; дальше только передает запросы."""
+
+    def __init__(self, app, timer: BootTimer = boot_timer):
+        self.app = app
+        self.timer = timer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.timer.first_response is not None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_timed(message):
+            if (
+                message["type"] == "http.response.start" and message["status"] < 400
+                and self.timer.first_response is None
+            ):
+                self.timer.response_sent(scope["path"])
+            await send(message)
+
+        await self.app(scope, receive, send_timed)
@@ -0,0 +1,136 @@
+from starlette.datastructures import Headers, MutableHeaders
+import gzip
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:  # без brotli ответы сжимаются только gzip
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # bytes
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+# Сжатие на лету: низкое качество brotli - компромисс между временем ответа и размером
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+NEVER_COMPRESS_TYPES = ("text/event-stream",)
+
+def choose_encoding(accept_encoding: str):
+    accepted = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        if params.strip().replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(name.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        self.encoding = encoding
+
+    def chunk(self, data: bytes) -> bytes:
+        """Сжимает часть потока и сбрасывает буфер, чтобы клиент получил ее сразу."""
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush(zlib.Z_FINISH)
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=COMPRESSION_GZIP_LEVEL)
+
+class CompressionMiddleware:
+    """Сжимает текстовые ответы br или gzip по Accept-Encoding.
+
+    Ответ одним телом сжимается, если он не меньше minimum_size; потоковый ответ
+    сжимается по частям с flush после каждой, чтобы не задерживать первые байты.
+    Не трогает ответы, у которых уже есть Content-Encoding (сжатая статика),
+    ответы на запросы диапазонов и text/event-stream.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                passthrough = (
+                    "content-encoding" in headers
+                    or "content-range" in headers
+                    or message["status"] in (204, 206, 304)
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                    or content_type.startswith(NEVER_COMPRESS_TYPES)
+                )
+                if passthrough:
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                headers["Content-Encoding"] = encoding
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    # Сжатое представление отличается побайтно: ETag становится слабым
+                    headers["ETag"] = "W/" + etag
+                if not more_body:
+                    body = compress(body, encoding)
+                    headers["Content-Length"] = str(len(body))
+                    await send(start_message)
+                    start_message = None
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                if "content-length" in headers:
+                    del headers["Content-Length"]
+                compressor = _Compressor(encoding)
+                await send(start_message)
+                start_message = None
+
+            data = compressor.chunk(body) if body else b""
+            if not more_body:
+                data += compressor.finish()
+            if data or not more_body:
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,20 +1,105 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
-from models import Base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 import os
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./max_univer.db")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {})
+def to_async_url(url: str) -> str:
+    """Подбирает асинхронный драйвер для того же URL: aiosqlite или asyncpg."""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    for prefix in ("postgresql+psycopg2:", "postgresql:", "postgres:"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg:" + url[len(prefix):]
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", to_async_url(DATABASE_URL))
+
+# Профиль движка: sqlite (WAL и pragma), postgres (пул соединений) или default (настройки SQLAlchemy)
+DB_PROFILE = os.getenv("DB_PROFILE") or ("sqlite" if DATABASE_URL.startswith("sqlite") else "postgres")
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))  # отрицательное значение - в КиБ
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+    "mmap_size": SQLITE_MMAP_SIZE,
+    "cache_size": SQLITE_CACHE_SIZE,
+}
+
+def engine_options(async_driver: bool) -> dict:
+    if DB_PROFILE == "postgres":
+        if async_driver:
+            connect_args = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            connect_args = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+        return {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_pre_ping": True,
+            "connect_args": connect_args,
+        }
+    if "sqlite" in DATABASE_URL and not async_driver:
+        return {"connect_args": {"check_same_thread": False}}
+    return {}
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+def describe_profile() -> str:
+    if DB_PROFILE == "sqlite":
+        settings = ", ".join(f"{name}={value}" for name, value in SQLITE_PRAGMAS.items())
+    elif DB_PROFILE == "postgres":
+        settings = (
+            f"pool_size={DB_POOL_SIZE}, max_overflow={DB_MAX_OVERFLOW}, pool_timeout={DB_POOL_TIMEOUT}s, "
+            f"pool_recycle={DB_POOL_RECYCLE}s, pre_ping=on, statement_timeout={DB_STATEMENT_TIMEOUT_MS}ms"
+        )
+    else:
+        settings = "настройки SQLAlchemy по умолчанию"
+    return f"Профиль БД: {DB_PROFILE} ({async_engine.url.render_as_string(hide_password=True)}; {settings})"
+
+def _create(create, url: str, async_driver: bool):
+    try:
+        return create(url, **engine_options(async_driver=async_driver))
+    except ModuleNotFoundError as e:
+        # Драйверы PostgreSQL не входят в requirements.txt
+        raise RuntimeError(
+            f"Не установлен драйвер БД {e.name} для {url.split(':', 1)[0]}: "
+            f"pip install -r requirements-postgres.txt (в Docker: --build-arg WITH_POSTGRES=1)"
+        ) from e
+
+# Синхронный движок нужен для создания схемы и скриптов (fill_data.py)
+engine = _create(create_engine, DATABASE_URL, async_driver=False)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Асинхронный движок обслуживает обработчики FastAPI, не блокируя event loop
+async_engine = _create(create_async_engine, ASYNC_DATABASE_URL, async_driver=True)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+if DB_PROFILE == "sqlite":
+    event.listen(engine, "connect", apply_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    """Приводит схему к последней версии (см. migrate.py)."""
+    from migrate import run_migrations
+    run_migrations()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
-
@@ -0,0 +1,179 @@
+"""События для страниц в реальном времени (Server-Sent Events, GET /events).
+
+Обработчики, которые создают заявки, документы и новости или меняют их статус,
+публикуют событие в каналы: "user:<id>" - владельцу записи, "role:<роль>" - всем
+пользователям роли (деканату - о новых заявках и новостях). Страница получает
+события через EventSource и обновляет статусы на месте вместо перезагрузки.
+
+Брокер живет в памяти процесса: при нескольких воркерах событие получают только
+подключения того воркера, который его опубликовал. Последние события хранятся,
+чтобы переподключившийся клиент (заголовок Last-Event-ID) получил пропущенные.
+"""
+from collections import deque, namedtuple
+from api import dumps
+import asyncio
+import os
+import time
+import uuid
+
+EVENTS_MAX_CONNECTIONS = int(os.getenv("EVENTS_MAX_CONNECTIONS", "1000"))
+EVENTS_MAX_PER_USER = int(os.getenv("EVENTS_MAX_PER_USER", "5"))  # вкладки одного пользователя
+EVENTS_HEARTBEAT = int(os.getenv("EVENTS_HEARTBEAT", "15"))  # seconds
+EVENTS_HISTORY = int(os.getenv("EVENTS_HISTORY", "1000"))
+# Соединение закрывается через столько секунд: клиент переподключается, заново проходит
+# проверку токена, а остановка сервера не ждет вечных соединений
+EVENTS_MAX_AGE = int(os.getenv("EVENTS_MAX_AGE", "600"))  # seconds
+# Клиент, который не успевает читать, отключается и догоняет по Last-Event-ID
+EVENTS_QUEUE_SIZE = 100
+# Через столько миллисекунд браузер переподключается после обрыва
+RETRY_MS = 3000
+
+Event = namedtuple("Event", ["id", "channels", "type", "data"])
+
+
+class TooManyConnections(Exception):
+    pass
+
+
+def user_channel(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def role_channel(role: str) -> str:
+    return f"role:{role}"
+
+
+def channels_for(user) -> set:
+    return {user_channel(user.id), role_channel(user.role)}
+
+
+def format_event(event: Event) -> str:
+    data = dumps(event.data).decode("utf-8")
+    return f"id: {event.id}\nevent: {event.type}\ndata: {data}\n\n"
+
+
+class Subscription:
+    def __init__(self, user_id: int, channels: set):
+        self.user_id = user_id
+        self.channels = channels
+        self.queue = asyncio.Queue(EVENTS_QUEUE_SIZE)
+        self.overflowed = False
+
+
+class EventBroker:
+    """Публикация событий по каналам и раздача подписчикам; только из потока цикла событий."""
+
+    def __init__(self, history: int = EVENTS_HISTORY):
+        # Номера событий начинаются заново при перезапуске; эпоха отличает номера разных запусков
+        self.epoch = uuid.uuid4().hex[:8]
+        self._counter = 0
+        self._history = deque(maxlen=history)
+        self._subscriptions = set()
+        self._per_user = {}
+
+    def publish(self, channels, event_type: str, data: dict):
+        """Отправляет событие подписчикам любого из каналов; каждый получает его один раз."""
+        self._counter += 1
+        event = Event(f"{self.epoch}-{self._counter}", frozenset(channels), event_type, data)
+        self._history.append(event)
+        for subscription in list(self._subscriptions):
+            if subscription.overflowed or subscription.channels.isdisjoint(event.channels):
+                continue
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                subscription.overflowed = True
+        return event
+
+    def subscribe(self, user) -> Subscription:
+        if len(self._subscriptions) >= EVENTS_MAX_CONNECTIONS:
+            raise TooManyConnections()
+        if self._per_user.get(user.id, 0) >= EVENTS_MAX_PER_USER:
+            raise TooManyConnections()
+        subscription = Subscription(user.id, channels_for(user))
+        self._subscriptions.add(subscription)
+        self._per_user[user.id] = self._per_user.get(user.id, 0) + 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription not in self._subscriptions:
+            return
+        self._subscriptions.discard(subscription)
+        remaining = self._per_user.get(subscription.user_id, 1) - 1
+        if remaining:
+            self._per_user[subscription.user_id] = remaining
+        else:
+            self._per_user.pop(subscription.user_id, None)
+
+    def missed(self, last_event_id: str, channels: set):
+        """События каналов после last_event_id; None, если их уже нет в истории или номер из другого запуска."""
+        epoch, _, number = last_event_id.partition("-")
+        if epoch != self.epoch or not number.isdigit():
+            return None
+        number = int(number)
+        if number > self._counter:
+            return None
+        oldest = int(self._history[0].id.partition("-")[2]) if self._history else self._counter + 1
+        # Пропущенные события вытеснены из истории
+        if number + 1 < oldest:
+            return None
+        return [
+            event for event in self._history
+            if int(event.id.partition("-")[2]) > number and not event.channels.isdisjoint(channels)
+        ]
+
+    @property
+    def last_id(self) -> str:
+        """Номер последнего события: страница передает его при подключении, чтобы не пропустить события после отрисовки."""
+        return f"{self.epoch}-{self._counter}"
+
+    def stats(self) -> dict:
+        return {"connections": len(self._subscriptions), "users": len(self._per_user), "last_event": self._counter}
+
+
+def record_changed(event_type: str, item_id: int, owner_id: int, status: str, **data):
+    """Сообщает владельцу записи и деканату о новой записи или смене ее статуса."""
+    return broker.publish(
+        (user_channel(owner_id), role_channel("deanery")), event_type,
+        {"id": item_id, "owner_id": owner_id, "status": status, **data}
+    )
+
+
+def records_changed(event_type: str, changed: dict, status: str):
+    """Пакетная смена статуса ({id: владелец}): по событию каждому владельцу и одно - деканату."""
+    by_owner = {}
+    for item_id, owner_id in changed.items():
+        by_owner.setdefault(owner_id, []).append(item_id)
+    for owner_id, ids in by_owner.items():
+        broker.publish((user_channel(owner_id),), event_type, {"ids": ids, "owner_id": owner_id, "status": status})
+    if changed:
+        broker.publish((role_channel("deanery"),), event_type, {"ids": sorted(changed), "status": status})
+
+
+async def stream(subscription: Subscription, missed):
+    """Тело ответа text/event-stream: пропущенные события, затем новые и комментарии-пульс."""
+    started = time.monotonic()
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        if missed is None:
+            # Пропущенное не восстановить: страница предложит обновиться
+            yield "event: resync\ndata: {}\n\n"
+        else:
+            for event in missed:
+                yield format_event(event)
+        while not subscription.overflowed:
+            remaining = EVENTS_MAX_AGE - (time.monotonic() - started)
+            if remaining <= 0:
+                break
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), min(EVENTS_HEARTBEAT, remaining))
+            except asyncio.TimeoutError:
+                # Комментарий не дает прокси закрыть молчащее соединение
+                yield ": ping\n\n"
+                continue
+            yield format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+broker = EventBroker()
@@ -1,21 +1,36 @@
 from database import SessionLocal, init_db
-from models import User, Schedule, News, Group, GroupStudent, AttendanceRecord
+from models import (
+    User, Schedule, News, Group, GroupStudent, AttendanceRecord, StudentAttendanceSummary,
+    GroupAttendanceSummary, DormitoryRequest, Document, DAYS_OF_WEEK, parse_time, search_key
+)
+from attendance_summary import rebuild_attendance_summaries
 from auth import get_password_hash
+from sqlalchemy import select, insert, func
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+import argparse
+import functools
+import random
+import time
+
+CHUNK_SIZE = 20000
+
+def clear_data(db):
+    """Удаляет все данные приложения (схема остается)."""
+    print("Удаление старых данных...")
+    for model in (
+        StudentAttendanceSummary, GroupAttendanceSummary, AttendanceRecord, GroupStudent, Group,
+        DormitoryRequest, Document, News, Schedule, User
+    ):
+        db.query(model).delete()
+    db.commit()
+    print("Старые данные удалены.")
 
 def fill_test_data(db):
     """Заполняет базу данных тестовыми данными (удаляет старые данные)"""
     
     # Удаляем все старые данные
-    print("Удаление старых данных...")
-    db.query(AttendanceRecord).delete()
-    db.query(GroupStudent).delete()
-    db.query(Group).delete()
-    db.query(News).delete()
-    db.query(Schedule).delete()
-    db.query(User).delete()
-    db.commit()
-    print("Старые данные удалены.")
+    clear_data(db)
     
     # Создаем пользователей
     users_data = [
@@ -27,19 +42,20 @@ def fill_test_data(db):
         {"username": "student3", "email": "student3@univer.ru", "password": "student123", "full_name": "Морозов Дмитрий Викторович", "role": "student"},
     ]
     
+    # Хэш считается один раз на пароль, а не на каждого пользователя
+    hashes = {password: get_password_hash(password) for password in {u["password"] for u in users_data}}
     created_users = {}
     for user_data in users_data:
         user = User(
             username=user_data["username"],
             email=user_data["email"],
-            hashed_password=get_password_hash(user_data["password"]),
+            hashed_password=hashes[user_data["password"]],
             full_name=user_data["full_name"],
             role=user_data["role"]
         )
         db.add(user)
-        db.commit()
-        db.refresh(user)
         created_users[user_data["username"]] = user
+    db.commit()
     
     # Создаем расписание
     schedules_data = [
@@ -131,14 +147,243 @@ def fill_test_data(db):
             db.add(group_student3)
     
     db.commit()
+    rebuild_attendance_summaries(db)
     
     print("Тестовые данные успешно добавлены!")
 
-if __name__ == "__main__":
+LAST_NAMES = ["Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов", "Новиков", "Федоров"]
+FIRST_NAMES = ["Александр", "Дмитрий", "Максим", "Сергей", "Андрей", "Алексей", "Артем", "Илья", "Кирилл", "Михаил"]
+SUBJECTS = ["Математика", "Физика", "Программирование", "Базы данных", "Алгоритмы", "История", "Английский язык", "Экономика"]
+LESSON_TIMES = [("09:00", "10:30"), ("10:45", "12:15"), ("13:00", "14:30"), ("14:45", "16:15"), ("16:30", "18:00")]
+STUDY_DAYS = DAYS_OF_WEEK[:6]
+DOCUMENT_TYPES = ["certificate", "academic_leave", "transfer", "vacation"]
+DORMITORY_TYPES = ["pass", "repair", "payment"]
+
+def _bulk_insert(connection, table, columns, rows):
+    """Пишет кортежи rows (в порядке columns) пачками через executemany драйвера.
+
+    Оператор компилируется один раз, обработка параметров SQLAlchemy на каждую строку
+    не выполняется; преобразования типов кэшируются по значению - даты посещаемости
+    повторяются у всей группы. rows может быть генератором.
+    """
+    dialect = connection.dialect
+    compiled = insert(table).compile(dialect=dialect, column_keys=columns)
+    if compiled.positional:
+        order = [columns.index(name) for name in compiled.positiontup]
+    else:
+        order = list(range(len(columns)))
+    processors = []
+    for position, name in enumerate(columns):
+        process = table.c[name].type.dialect_impl(dialect).bind_processor(dialect)
+        if process:
+            processors.append((position, functools.lru_cache(maxsize=4096)(process)))
+
+    def convert(row):
+        if processors:
+            row = list(row)
+            for position, process in processors:
+                if row[position] is not None:
+                    row[position] = process(row[position])
+        if compiled.positional:
+            return tuple(row[position] for position in order)
+        return dict(zip(columns, row))
+
+    count = 0
+    chunk = []
+    for row in rows:
+        chunk.append(convert(row))
+        if len(chunk) >= CHUNK_SIZE:
+            connection.exec_driver_sql(compiled.string, chunk)
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        connection.exec_driver_sql(compiled.string, chunk)
+        count += len(chunk)
+    return count
+
+@contextmanager
+def _indexes_dropped(connection, table):
+    """Снимает вторичные индексы на время загрузки: построить индекс заново быстрее,
+    чем обновлять его на каждой вставке."""
+    indexes = [index for index in table.indexes if not index.unique]
+    for index in indexes:
+        index.drop(connection)
+    try:
+        yield
+    finally:
+        # Индексы возвращаются и при ошибке загрузки, иначе база останется без них
+        for index in indexes:
+            index.create(connection, checkfirst=True)
+
+def _new_ids(connection, table, after_id):
+    return connection.execute(
+        select(table.c.id).where(table.c.id > after_id).order_by(table.c.id)
+    ).scalars().all()
+
+def _max_id(connection, table):
+    return connection.execute(select(func.coalesce(func.max(table.c.id), 0))).scalar()
+
+def fill_scale_data(db, students=1000, teachers=50, groups=40, weeks=16, lessons_per_week=3,
+                    news=1000, documents=2000, dormitory=2000, seed=1):
+    """Добавляет синтетические данные нагрузочного объема поверх демонстрационных.
+
+    Пароли хэшируются один раз на роль (student123, teacher123). Посещаемость
+    покрывает семестр длиной weeks недель: lessons_per_week занятий у каждой группы.
+    Возвращает число добавленных строк по таблицам.
+    """
+    rng = random.Random(seed)
+    connection = db.connection()
+    users_table = User.__table__
+    now = datetime.utcnow()
+    semester_start = (now - timedelta(weeks=weeks)).replace(hour=0, minute=0, second=0, microsecond=0)
+    hashes = {role: get_password_hash(f"{role}123") for role in ("student", "teacher")}
+    stats = {}
+
+    def add_users(role, count):
+        start_id = _max_id(connection, users_table)
+        names = (f"{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)}" for _ in range(count))
+        _bulk_insert(
+            connection, users_table,
+            ["username", "email", "hashed_password", "full_name", "search_key", "role", "is_active", "token_version", "created_at"],
+            (
+                (f"{role}_{n}", f"{role}_{n}@load.univer.ru", hashes[role],
+                 full_name, search_key(full_name), role, True, 0, semester_start)
+                for n, full_name in enumerate(names, 1)
+            )
+        )
+        return _new_ids(connection, users_table, start_id)
+
+    teacher_ids = add_users("teacher", teachers)
+    student_ids = add_users("student", students)
+    stats["users"] = len(teacher_ids) + len(student_ids)
+
+    groups_table = Group.__table__
+    start_id = _max_id(connection, groups_table)
+    _bulk_insert(connection, groups_table, ["name", "teacher_id", "created_at"], (
+        (f"Группа НГ-{n:05d}", teacher_ids[n % len(teacher_ids)], semester_start) for n in range(groups)
+    ))
+    group_ids = _new_ids(connection, groups_table, start_id)
+    stats["groups"] = len(group_ids)
+
+    # Студенты распределяются по группам по кругу
+    members = {group_id: [] for group_id in group_ids}
+    for n, student_id in enumerate(student_ids):
+        members[group_ids[n % len(group_ids)]].append(student_id)
+    stats["group_students"] = _bulk_insert(connection, GroupStudent.__table__, ["group_id", "student_id", "added_at"], (
+        (group_id, student_id, semester_start)
+        for group_id, student_list in members.items() for student_id in student_list
+    ))
+
+    # Пары: каждая аудитория занята не более одного раза в каждом слоте
+    slots = [(day, times) for day in STUDY_DAYS for times in LESSON_TIMES]
+    teacher_names = dict(zip(teacher_ids, connection.execute(
+        select(users_table.c.full_name).where(users_table.c.id.in_(teacher_ids)).order_by(users_table.c.id)
+    ).scalars()))
+
+    def schedules():
+        for n in range(len(group_ids) * lessons_per_week):
+            day, (time_start, time_end) = slots[n % len(slots)]
+            teacher_id = teacher_ids[(n // len(slots)) % len(teacher_ids)]
+            yield (
+                SUBJECTS[n % len(SUBJECTS)], day, time_start, time_end, DAYS_OF_WEEK.index(day),
+                parse_time(time_start), parse_time(time_end), str(100 + n // len(slots)),
+                teacher_names[teacher_id], semester_start
+            )
+    stats["schedules"] = _bulk_insert(connection, Schedule.__table__, [
+        "subject", "day_of_week", "time_start", "time_end", "day_index", "start_minute", "end_minute",
+        "room", "teacher_name", "created_at"
+    ], schedules())
+
+    def attendance():
+        for index, (group_id, student_list) in enumerate(members.items()):
+            for week in range(weeks):
+                for lesson in range(lessons_per_week):
+                    day_offset = (index + lesson * 2) % len(STUDY_DAYS)
+                    date = semester_start + timedelta(days=week * 7 + day_offset, hours=9 + lesson)
+                    if date > now:
+                        continue
+                    for student_id in student_list:
+                        yield (group_id, student_id, date, rng.random() < 0.85, date)
+    attendance_table = AttendanceRecord.__table__
+    with _indexes_dropped(connection, attendance_table):
+        stats["attendance_records"] = _bulk_insert(
+            connection, attendance_table, ["group_id", "student_id", "date", "present", "created_at"], attendance()
+        )
+
+    def moments(count):
+        span = (now - semester_start).total_seconds()
+        return sorted(semester_start + timedelta(seconds=rng.random() * span) for _ in range(count))
+
+    authors = teacher_ids + student_ids[:len(teacher_ids)]
+
+    def news_items():
+        for n, created_at in enumerate(moments(news)):
+            status = rng.choices(["approved", "pending", "rejected"], weights=[80, 15, 5])[0]
+            yield (
+                f"Новость №{n + 1}: {rng.choice(SUBJECTS)}",
+                f"Синтетическая новость для нагрузочного тестирования. {rng.choice(SUBJECTS)}, аудитория {100 + n % 50}.",
+                rng.choice(authors), status, created_at, created_at if status == "approved" else None
+            )
+    stats["news"] = _bulk_insert(
+        connection, News.__table__,
+        ["title", "description", "author_id", "status", "created_at", "approved_at"], news_items()
+    )
+
+    def requests(count, types, statuses):
+        for created_at in moments(count):
+            status = rng.choice(statuses)
+            processed_at = None if status == "pending" else created_at + timedelta(days=1)
+            yield (rng.choice(student_ids), rng.choice(types), "Синтетическая заявка", status, created_at, processed_at)
+    stats["documents"] = _bulk_insert(
+        connection, Document.__table__,
+        ["user_id", "document_type", "description", "status", "created_at", "processed_at"],
+        requests(documents, DOCUMENT_TYPES, ["pending", "pending", "approved", "rejected", "issued"])
+    )
+    stats["dormitory_requests"] = _bulk_insert(
+        connection, DormitoryRequest.__table__,
+        ["user_id", "request_type", "description", "status", "created_at", "processed_at"],
+        requests(dormitory, DORMITORY_TYPES, ["pending", "pending", "approved", "rejected", "completed"])
+    )
+
+    db.commit()
+    rebuild_attendance_summaries(db)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Заполняет БД демонстрационными данными, а с --scale - данными нагрузочного объема."
+    )
+    parser.add_argument("--scale", action="store_true", help="добавить синтетические данные поверх демонстрационных")
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--teachers", type=int, default=50)
+    parser.add_argument("--groups", type=int, default=40)
+    parser.add_argument("--weeks", type=int, default=16, help="длина семестра посещаемости")
+    parser.add_argument("--lessons-per-week", type=int, default=3)
+    parser.add_argument("--news", type=int, default=1000)
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--dormitory", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    if args.scale and min(args.students, args.teachers, args.groups) < 1:
+        parser.error("--students, --teachers и --groups должны быть положительными")
+
     init_db()
     db = SessionLocal()
     try:
         fill_test_data(db)
+        if args.scale:
+            started = time.perf_counter()
+            stats = fill_scale_data(
+                db, students=args.students, teachers=args.teachers, groups=args.groups,
+                weeks=args.weeks, lessons_per_week=args.lessons_per_week, news=args.news,
+                documents=args.documents, dormitory=args.dormitory, seed=args.seed
+            )
+            for name, count in stats.items():
+                print(f"  {name}: {count}")
+            print(f"Синтетические данные добавлены за {time.perf_counter() - started:.1f} с")
     finally:
         db.close()
 
+if __name__ == "__main__":
+    main()
+
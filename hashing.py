@@ -0,0 +1,12 @@
+from pools import BoundedPool, PoolSaturated
+import os
+
+HASH_POOL_KIND = os.getenv("HASH_POOL_KIND", "thread")  # thread, process
+HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_POOL_MAX_QUEUE = int(os.getenv("HASH_POOL_MAX_QUEUE", "64"))
+
+class HashPoolSaturated(PoolSaturated):
+    """Очередь хеширования паролей заполнена: вход отклоняется с 503."""
+
+# Пул для CPU-тяжелого хеширования паролей
+hash_pool = BoundedPool("hash", HASH_POOL_KIND, HASH_POOL_WORKERS, HASH_POOL_MAX_QUEUE, saturated=HashPoolSaturated)
@@ -0,0 +1,112 @@
+"""Уменьшенные копии фото новостей (WebP и JPEG) для srcset.
+
+Копии строятся в фоновом пуле после сохранения новости. Для новостей,
+загруженных раньше, их можно построить командой:
+
+    python images.py
+"""
+from storage import TMP_DIR, UPLOAD_CHUNK_SIZE, url_to_path
+from pools import BoundedPool
+import hashlib
+import os
+import tempfile
+
+# Ширина копий в пикселях: миниатюра, карточка и полная ширина
+IMAGE_WIDTHS = {"thumb": 320, "card": 640, "full": 1280}
+IMAGE_FORMATS = {
+    "webp": {"format": "WEBP", "quality": int(os.getenv("IMAGE_WEBP_QUALITY", "80")), "method": 4},
+    "jpeg": {"format": "JPEG", "quality": int(os.getenv("IMAGE_JPEG_QUALITY", "82")), "optimize": True, "progressive": True},
+}
+EXTENSIONS = {"webp": ".webp", "jpeg": ".jpg"}
+
+IMAGE_POOL_KIND = os.getenv("IMAGE_POOL_KIND", "thread")  # thread, process
+IMAGE_POOL_WORKERS = int(os.getenv("IMAGE_POOL_WORKERS", "2"))
+IMAGE_POOL_MAX_QUEUE = int(os.getenv("IMAGE_POOL_MAX_QUEUE", "32"))
+
+def derived_url(digest: str, width: int, fmt: str) -> str:
+    return f"/uploads/derived/{digest[:2]}/{digest}-{width}{EXTENSIONS[fmt]}"
+
+def _save_atomic(image, path: str, options: dict):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.makedirs(TMP_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=TMP_DIR, suffix=os.path.splitext(path)[1])
+    try:
+        with os.fdopen(fd, "wb") as target:
+            image.save(target, **options)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _flatten(image):
+    """JPEG не поддерживает прозрачность: прозрачные области заливаются белым."""
+    from PIL import Image, ImageOps
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def build_derivatives(photo_url: str, digest: str = None) -> dict:
+    """Строит копии фото и возвращает описание для News.photo_variants.
+
+    Имена копий зависят от хэша исходного файла (digest, который посчитало
+    хранилище при загрузке), поэтому для повторно загруженного фото существующие
+    копии не перезаписываются. Исходник не увеличивается: если он уже, чем копия,
+    копия получает его ширину.
+    """
+    # Pillow импортируется при первой обработке фото, а не при запуске приложения
+    from PIL import Image
+    source_path = url_to_path(photo_url)
+    if digest is None:
+        # Фото, загруженные до хранилища по хэшу, хэшируются здесь
+        digest = _file_digest(source_path)
+
+    largest = max(IMAGE_WIDTHS.values())
+    with Image.open(source_path) as original:
+        # JPEG декодируется сразу в уменьшенном масштабе, не меньше самой широкой копии
+        original.draft("RGB", (largest, largest))
+        image = _flatten(original)
+    width, height = image.size
+    targets = sorted({min(target, width) for target in IMAGE_WIDTHS.values()}, reverse=True)
+    for target in targets:
+        if image.width != target:
+            image = image.resize((target, max(1, round(height * target / width))), Image.LANCZOS)
+        for fmt, options in IMAGE_FORMATS.items():
+            path = url_to_path(derived_url(digest, target, fmt))
+            if not os.path.exists(path):
+                _save_atomic(image, path, options)
+
+    variants = {"width": width, "height": height, **{fmt: [] for fmt in IMAGE_FORMATS}}
+    for target in sorted(targets):
+        for fmt in IMAGE_FORMATS:
+            variants[fmt].append([derived_url(digest, target, fmt), target])
+    return variants
+
+image_pool = BoundedPool("image", IMAGE_POOL_KIND, IMAGE_POOL_WORKERS, IMAGE_POOL_MAX_QUEUE)
+
+if __name__ == "__main__":
+    from database import SessionLocal
+    from models import News
+    db = SessionLocal()
+    try:
+        items = db.query(News).filter(News.photo_path.is_not(None), News.photo_variants.is_(None)).all()
+        for item in items:
+            try:
+                item.photo_variants = build_derivatives(item.photo_path)
+            except (OSError, ValueError) as e:
+                print(f"  новость {item.id}: {e}")
+        db.commit()
+        print(f"Обработано новостей с фото: {len(items)}")
+    finally:
+        db.close()
@@ -1,16 +1,36 @@
-from fastapi import FastAPI, Depends, HTTPException, Request, Form, File, UploadFile
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+from fastapi import FastAPI, Depends, HTTPException, Request, Form, File, UploadFile, BackgroundTasks
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.exceptions import RequestValidationError
-from sqlalchemy.orm import Session
-from database import get_db, init_db, SessionLocal
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select, insert, update, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, init_db, engine, SessionLocal, AsyncSessionLocal, async_engine, describe_profile
 from models import *
 from auth import *
+from pagination import keyset_page
+from hashing import hash_pool, HashPoolSaturated
+from pools import PoolSaturated
+from attendance_summary import upsert_attendance
+from schedule_index import schedule_index, lock_schedules, find_conflicts_in_db
+from page_cache import page_cache
+from news_search import search_news
+from images import image_pool, build_derivatives
+from static_assets import CachedStaticFiles, static_url
+from compression import CompressionMiddleware
+from templating import create_templates, precompile
+from boot import boot_timer, FirstResponseMiddleware
+from metrics import METRICS_TOKEN, MetricsMiddleware, instrument_engine, instrument_templates, register_gauge, render_metrics
+from api import router as api_router, is_api_request, api_error
+from events import broker, record_changed, records_changed, stream, TooManyConnections
+from moderation import set_status, batch_response
+from query_audit import SQL_AUDIT, QueryAuditMiddleware, audit_engine
+from storage import UPLOAD_DIR, UPLOAD_MAX_BYTES, StoredUpload, UploadTooLarge, UnsupportedUpload, UploadLimitMiddleware, has_file, save_upload
 from datetime import datetime, timedelta
+import hmac
 import os
-import shutil
-from typing import Optional
+from typing import List, Optional
 import traceback
 
 app = FastAPI(title="MAX UNIVER")
@@ -18,17 +38,49 @@ app = FastAPI(title="MAX UNIVER")
 # Создаем директории для статики и шаблонов
 os.makedirs("static", exist_ok=True)
 os.makedirs("templates", exist_ok=True)
-os.makedirs("uploads", exist_ok=True)
+os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
-templates = Jinja2Templates(directory="templates")
+app.mount("/static", CachedStaticFiles(directory="static", precompressed=True), name="static")
+app.mount("/uploads", CachedStaticFiles(directory=UPLOAD_DIR, ranges=True), name="uploads")
+templates = create_templates()
+templates.env.globals["static_url"] = static_url
+templates.env.globals["events_since"] = lambda: broker.last_id
+instrument_templates(templates)
+instrument_engine(engine, "sync")
+instrument_engine(async_engine.sync_engine, "async")
+# Учет SQL нужен и query_budget() в тестах, поэтому подключается всегда; без SQL_AUDIT он почти ничего не стоит
+audit_engine(engine)
+audit_engine(async_engine.sync_engine)
+register_gauge("events_connections", "Открытые потоки событий /events", lambda: broker.stats()["connections"])
 
-# Инициализация БД при запуске
-@app.on_event("startup")
-async def startup_event():
-    init_db()
-    # Всегда удаляем старые данные и заполняем новыми
+# Части потоковой страницы копятся до этого размера, чтобы не отправлять каждую строку шаблона отдельно
+STREAM_CHUNK_SIZE = 16 * 1024
+
+def stream_template(name: str, context: dict, status_code: int = 200) -> StreamingResponse:
+    """Отдает страницу по мере отрисовки: первые байты уходят до того, как готова вся таблица."""
+    pieces = templates.get_template(name).generate(context)
+    
+    async def body():
+        buffer, size = [], 0
+        for piece in pieces:
+            buffer.append(piece)
+            size += len(piece)
+            if size >= STREAM_CHUNK_SIZE:
+                yield "".join(buffer).encode("utf-8")
+                buffer, size = [], 0
+        if buffer:
+            yield "".join(buffer).encode("utf-8")
+    
+    return StreamingResponse(body(), status_code=status_code, media_type="text/html")
+
+# Миграции выполняются при развертывании (python migrate.py); AUTO_MIGRATE=1 - для локальной разработки
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "0") == "1"
+# SEED_ON_STARTUP=1 очищает БД и заполняет демонстрационными данными при каждом запуске
+SEED_ON_STARTUP = os.getenv("SEED_ON_STARTUP", "0") == "1"
+
+boot_timer.mark("импорт")
+
+def seed_demo_data():
     try:
         from fill_data import fill_test_data
         db = SessionLocal()
@@ -42,9 +94,35 @@ async def startup_event():
     except Exception as e:
         print(f"Не удалось импортировать fill_data: {e}")
 
+# Подготовка к приему запросов: сервер начинает принимать соединения после этой функции
+@app.on_event("startup")
+async def startup_event():
+    boot_timer.mark("запуск сервера")
+    print(describe_profile())
+    if AUTO_MIGRATE:
+        init_db()
+        boot_timer.mark("миграции")
+    if SEED_ON_STARTUP:
+        seed_demo_data()
+        boot_timer.mark("заполнение БД")
+    count = precompile(templates)
+    boot_timer.mark(f"шаблоны ({count})")
+    # Первое соединение (и pragma SQLite) открывается до первого запроса
+    async with async_engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+    boot_timer.mark("соединение с БД")
+    print(boot_timer.report())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    hash_pool.shutdown()
+    image_pool.shutdown()
+
 # Глобальный обработчик ошибок
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
+    if is_api_request(request):
+        return api_error(500, "Internal server error")
     error_message = str(exc)
     if isinstance(exc, ValueError):
         error_message = f"Ошибка в данных: {error_message}"
@@ -60,13 +138,49 @@ async def global_exception_handler(request: Request, exc: Exception):
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    if is_api_request(request):
+        return api_error(422, jsonable_encoder(exc.errors()))
     return templates.TemplateResponse("error.html", {
         "request": request,
         "error_message": "Ошибка валидации данных. Проверьте правильность введенных данных."
     }, status_code=400)
 
+@app.exception_handler(HashPoolSaturated)
+async def hash_pool_saturated_handler(request: Request, exc: HashPoolSaturated):
+    if is_api_request(request):
+        return api_error(503, "Too many logins in progress", headers={"Retry-After": "2"})
+    return templates.TemplateResponse("error.html", {
+        "request": request,
+        "error_message": "Сервер перегружен входами. Повторите попытку через несколько секунд."
+    }, status_code=503, headers={"Retry-After": "2"})
+
+@app.exception_handler(UploadTooLarge)
+async def upload_too_large_handler(request: Request, exc: UploadTooLarge):
+    return templates.TemplateResponse("error.html", {
+        "request": request,
+        "error_message": f"Файл слишком большой. Максимальный размер - {UPLOAD_MAX_BYTES // (1024 * 1024)} МБ."
+    }, status_code=413)
+
+@app.exception_handler(UnsupportedUpload)
+async def unsupported_upload_handler(request: Request, exc: UnsupportedUpload):
+    return templates.TemplateResponse("error.html", {
+        "request": request,
+        "error_message": "Можно загрузить только изображение: JPG, PNG, GIF или WebP."
+    }, status_code=400)
+
+app.add_middleware(UploadLimitMiddleware, on_too_large=upload_too_large_handler)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(FirstResponseMiddleware)
+if SQL_AUDIT:
+    app.add_middleware(QueryAuditMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+app.include_router(api_router)
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
+    if is_api_request(request):
+        return api_error(exc.status_code, exc.detail, headers=exc.headers)
     return templates.TemplateResponse("error.html", {
         "request": request,
         "error_message": exc.detail
@@ -90,7 +204,7 @@ async def register(
     password: str = Form(...),
     full_name: str = Form(...),
     role: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     try:
         if role not in ["student", "teacher", "deanery"]:
@@ -99,19 +213,19 @@ async def register(
                 "error_message": "Неверная роль"
             }, status_code=400)
         
-        if get_user_by_username(db, username):
+        if await get_user_by_username(db, username):
             return templates.TemplateResponse("error.html", {
                 "request": request,
                 "error_message": "Пользователь с таким именем уже существует"
             }, status_code=400)
         
-        if get_user_by_email(db, email):
+        if await get_user_by_email(db, email):
             return templates.TemplateResponse("error.html", {
                 "request": request,
                 "error_message": "Пользователь с таким email уже существует"
             }, status_code=400)
         
-        hashed_password = get_password_hash(password)
+        hashed_password = await get_password_hash_async(password)
         user = User(
             username=username,
             email=email,
@@ -120,13 +234,15 @@ async def register(
             role=role
         )
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
         
-        access_token = create_access_token(data={"sub": user.username})
+        access_token = create_access_token(data=user_claims(user))
         response = RedirectResponse(url="/dashboard", status_code=303)
         response.set_cookie(key="access_token", value=access_token, httponly=True)
         return response
+    except HashPoolSaturated:
+        raise
     except Exception as e:
         return templates.TemplateResponse("error.html", {
             "request": request,
@@ -142,20 +258,23 @@ async def login(
     request: Request,
     username: str = Form(...),
     password: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     try:
-        user = authenticate_user(db, username, password)
+        user = await authenticate_user(db, username, password)
         if not user:
             return templates.TemplateResponse("error.html", {
                 "request": request,
                 "error_message": "Неверное имя пользователя или пароль"
             }, status_code=401)
         
-        access_token = create_access_token(data={"sub": user.username})
+        remember_user(user)
+        access_token = create_access_token(data=user_claims(user))
         response = RedirectResponse(url="/dashboard", status_code=303)
         response.set_cookie(key="access_token", value=access_token, httponly=True)
         return response
+    except HashPoolSaturated:
+        raise
     except Exception as e:
         return templates.TemplateResponse("error.html", {
             "request": request,
@@ -163,28 +282,40 @@ async def login(
         }, status_code=500)
 
 @app.get("/logout")
-async def logout():
+async def logout(request: Request, db: AsyncSession = Depends(get_db)):
+    user = await get_current_user_from_cookie(request, db)
+    if user:
+        await bump_token_version(db, user.id)
     response = RedirectResponse(url="/", status_code=303)
     response.delete_cookie(key="access_token")
     return response
 
-def get_current_user_from_cookie(request: Request, db: Session = Depends(get_db)):
+async def get_current_user_from_cookie(request: Request, db: AsyncSession):
     token = request.cookies.get("access_token")
     if not token:
         return None
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            return None
-        user = get_user_by_username(db, username=username)
-        return user
-    except JWTError:
-        return None
+    return await get_user_from_token(db, token)
+
+@app.get("/admin/hash-pool")
+async def hash_pool_stats(request: Request, db: AsyncSession = Depends(get_db)):
+    user = await get_current_user_from_cookie(request, db)
+    if not user or user.role != "deanery":
+        raise HTTPException(status_code=403, detail="Access denied")
+    return JSONResponse(hash_pool.stats())
+
+@app.get("/metrics")
+async def metrics_endpoint(request: Request, db: AsyncSession = Depends(get_db)):
+    # Сборщик метрик передает METRICS_TOKEN; в браузере метрики доступны деканату
+    authorization = request.headers.get("authorization", "")
+    if not (METRICS_TOKEN and hmac.compare_digest(authorization, f"Bearer {METRICS_TOKEN}")):
+        user = await get_current_user_from_cookie(request, db)
+        if not user or user.role != "deanery":
+            raise HTTPException(status_code=403, detail="Access denied")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 @app.get("/dashboard", response_class=HTMLResponse)
-async def dashboard(request: Request, db: Session = Depends(get_db)):
-    user = get_current_user_from_cookie(request, db)
+async def dashboard(request: Request, db: AsyncSession = Depends(get_db)):
+    user = await get_current_user_from_cookie(request, db)
     if not user:
         return RedirectResponse(url="/login", status_code=303)
     
@@ -193,33 +324,62 @@ async def dashboard(request: Request, db: Session = Depends(get_db)):
         "user": user
     })
 
+# ========== СОБЫТИЯ ==========
+
+@app.get("/events")
+async def events_stream(request: Request, since: Optional[str] = None):
+    """Поток изменений статусов для открытых страниц (text/event-stream)."""
+    # Сессия БД нужна только для проверки токена и не держится открытой, пока идет поток
+    async with AsyncSessionLocal() as db:
+        user = await get_current_user_from_cookie(request, db)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    try:
+        subscription = broker.subscribe(user)
+    except TooManyConnections:
+        raise HTTPException(status_code=429, detail="Too many event streams")
+    # После обрыва браузер сам передает Last-Event-ID; since - номер события на момент отрисовки страницы
+    last_event_id = request.headers.get("last-event-id") or since
+    missed = broker.missed(last_event_id, subscription.channels) if last_event_id else []
+    return StreamingResponse(
+        stream(subscription, missed),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # ========== РАСПИСАНИЕ ==========
 
 @app.get("/schedule", response_class=HTMLResponse)
-async def schedule_page(request: Request, db: Session = Depends(get_db)):
+async def schedule_page(request: Request, db: AsyncSession = Depends(get_db)):
     try:
-        user = get_current_user_from_cookie(request, db)
+        user = await get_current_user_from_cookie(request, db)
         if not user:
             return RedirectResponse(url="/login", status_code=303)
         
-        schedules = db.query(Schedule).order_by(
-            Schedule.day_of_week, Schedule.time_start
-        ).all()
+        cached = page_cache.get("schedule", (user.role,))
+        if cached:
+            return page_cache.response(request, cached)
+        
+        schedules = (await db.scalars(
+            select(Schedule).order_by(Schedule.day_index, Schedule.start_minute)
+        )).all()
         
-        days_order = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-        schedules_by_day = {}
-        for day in days_order:
-            schedules_by_day[day] = [s for s in schedules if s.day_of_week == day]
+        schedules_by_day = {day: [] for day in DAYS_OF_WEEK}
+        for schedule in schedules:
+            schedules_by_day.setdefault(schedule.day_of_week, []).append(schedule)
         
-        has_schedules = any(schedules_by_day.values())
+        has_schedules = bool(schedules)
         
-        return templates.TemplateResponse("schedule.html", {
+        # Страница зависит только от роли, поэтому кэшируется по ней
+        html = templates.get_template("schedule.html").render({
             "request": request,
             "user": user,
             "schedules_by_day": schedules_by_day,
             "can_edit": user.role == "deanery",
             "has_schedules": has_schedules
         })
+        return page_cache.response(request, page_cache.set("schedule", (user.role,), html))
     except Exception as e:
         return templates.TemplateResponse("error.html", {
             "request": request,
@@ -235,10 +395,10 @@ async def add_schedule(
     time_end: str = Form(...),
     room: str = Form(None),
     teacher_name: str = Form(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     try:
-        user = get_current_user_from_cookie(request, db)
+        user = await get_current_user_from_cookie(request, db)
         if not user or user.role != "deanery":
             return templates.TemplateResponse("error.html", {
                 "request": request,
@@ -254,9 +414,34 @@ async def add_schedule(
             teacher_name=teacher_name,
             created_by=user.id
         )
+        if schedule.end_minute <= schedule.start_minute:
+            raise ValueError("Пара должна заканчиваться позже, чем начинается")
+        
+        # Проверка идет в БД внутри транзакции вставки: индекс в памяти не видит пары других воркеров
+        await lock_schedules(db)
         db.add(schedule)
-        db.commit()
+        await db.flush()
+        conflicts = await find_conflicts_in_db(db, schedule)
+        if conflicts:
+            await db.rollback()
+            # Индекс мог не знать о конфликтующей паре
+            schedule_index.invalidate()
+            reason = "аудитория уже занята" if "room" in conflicts else "преподаватель уже ведет другую пару"
+            return templates.TemplateResponse("error.html", {
+                "request": request,
+                "error_message": f"Пара пересекается с существующей: {reason}"
+            }, status_code=409)
+        await db.commit()
+        schedule_index.add(
+            schedule.id, schedule.day_index, schedule.start_minute, schedule.end_minute, room, teacher_name
+        )
+        page_cache.invalidate("schedule")
         return RedirectResponse(url="/schedule", status_code=303)
+    except ValueError as e:
+        return templates.TemplateResponse("error.html", {
+            "request": request,
+            "error_message": f"Ошибка в данных: {str(e)}"
+        }, status_code=400)
     except Exception as e:
         return templates.TemplateResponse("error.html", {
             "request": request,
@@ -267,29 +452,66 @@ async def add_schedule(
 async def delete_schedule(
     request: Request,
     schedule_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = get_current_user_from_cookie(request, db)
+    user = await get_current_user_from_cookie(request, db)
     if not user or user.role != "deanery":
         raise HTTPException(status_code=403, detail="Only deanery can delete schedules")
     
-    schedule = db.query(Schedule).filter(Schedule.id == schedule_id).first()
+    schedule = await db.get(Schedule, schedule_id)
     if schedule:
-        db.delete(schedule)
-        db.commit()
+        await db.delete(schedule)
+        await db.commit()
+        schedule_index.remove(
+            schedule.id, schedule.day_index, schedule.start_minute, schedule.room, schedule.teacher_name
+        )
+        page_cache.invalidate("schedule")
     return RedirectResponse(url="/schedule", status_code=303)
 
+@app.get("/schedule/free-rooms", response_class=HTMLResponse)
+async def free_rooms_page(
+    request: Request,
+    day_of_week: str,
+    time_start: str,
+    time_end: str,
+    db: AsyncSession = Depends(get_db)
+):
+    user = await get_current_user_from_cookie(request, db)
+    if not user:
+        return RedirectResponse(url="/login", status_code=303)
+    
+    if day_of_week not in DAYS_OF_WEEK:
+        raise HTTPException(status_code=400, detail="Unknown day of week")
+    try:
+        start, end = parse_time(time_start), parse_time(time_end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Time must be HH:MM")
+    
+    await schedule_index.ensure_loaded(db)
+    rooms = schedule_index.free_rooms(DAYS_OF_WEEK.index(day_of_week), start, end)
+    
+    return templates.TemplateResponse("free_rooms.html", {
+        "request": request,
+        "user": user,
+        "day_of_week": day_of_week,
+        "time_start": time_start,
+        "time_end": time_end,
+        "rooms": rooms
+    })
+
 # ========== ОБЩЕЖИТИЕ ==========
 
 @app.get("/dormitory", response_class=HTMLResponse)
-async def dormitory_page(request: Request, db: Session = Depends(get_db)):
-    user = get_current_user_from_cookie(request, db)
+async def dormitory_page(request: Request, db: AsyncSession = Depends(get_db)):
+    user = await get_current_user_from_cookie(request, db)
     if not user:
         return RedirectResponse(url="/login", status_code=303)
     
-    requests = db.query(DormitoryRequest).filter(
-        DormitoryRequest.user_id == user.id
-    ).order_by(DormitoryRequest.created_at.desc()).all()
+    requests = (await db.scalars(
+        select(DormitoryRequest).where(
+            DormitoryRequest.user_id == user.id
+        ).order_by(DormitoryRequest.created_at.desc())
+    )).all()
     
     return templates.TemplateResponse("dormitory.html", {
         "request": request,
@@ -302,9 +524,9 @@ async def create_dormitory_request(
     request: Request,
     request_type: str = Form(...),
     description: str = Form(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = get_current_user_from_cookie(request, db)
+    user = await get_current_user_from_cookie(request, db)
     if not user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
@@ -315,23 +537,37 @@ async def create_dormitory_request(
         status="pending"
     )
     db.add(dorm_request)
-    db.commit()
+    await db.commit()
+    record_changed("dormitory_request", dorm_request.id, user.id, "pending")
     return RedirectResponse(url="/dormitory", status_code=303)
 
 @app.get("/dormitory/admin", response_class=HTMLResponse)
-async def dormitory_admin(request: Request, db: Session = Depends(get_db)):
-    user = get_current_user_from_cookie(request, db)
+async def dormitory_admin(
+    request: Request,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    user = await get_current_user_from_cookie(request, db)
     if not user or user.role != "deanery":
         raise HTTPException(status_code=403, detail="Access denied")
     
-    all_requests = db.query(DormitoryRequest).order_by(
-        DormitoryRequest.created_at.desc()
-    ).all()
+    if status and status not in DORMITORY_REQUEST_STATUSES:
+        raise HTTPException(status_code=400, detail="Unknown status")
+    
+    stmt = select(DormitoryRequest).options(joinedload(DormitoryRequest.user))
+    if status:
+        stmt = stmt.where(DormitoryRequest.status == status)
+    page, next_cursor = await keyset_page(db, stmt, DormitoryRequest, cursor, limit)
     
-    return templates.TemplateResponse("dormitory_admin.html", {
+    return stream_template("dormitory_admin.html", {
         "request": request,
         "user": user,
-        "requests": all_requests
+        "requests": page,
+        "status": status,
+        "cursor": cursor,
+        "next_cursor": next_cursor
     })
 
 @app.post("/dormitory/update/{request_id}")
@@ -339,31 +575,53 @@ async def update_dormitory_request(
     request: Request,
     request_id: int,
     status: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = get_current_user_from_cookie(request, db)
+    user = await get_current_user_from_cookie(request, db)
     if not user or user.role != "deanery":
         raise HTTPException(status_code=403, detail="Access denied")
     
-    dorm_request = db.query(DormitoryRequest).filter(DormitoryRequest.id == request_id).first()
+    dorm_request = await db.get(DormitoryRequest, request_id)
     if dorm_request:
         dorm_request.status = status
         dorm_request.processed_at = datetime.utcnow()
-        db.commit()
+        await db.commit()
+        record_changed("dormitory_request", dorm_request.id, dorm_request.user_id, status)
     
     return RedirectResponse(url="/dormitory/admin", status_code=303)
 
+@app.post("/dormitory/batch")
+async def batch_update_dormitory_requests(
+    request: Request,
+    status: str = Form(...),
+    ids: List[int] = Form([]),
+    db: AsyncSession = Depends(get_db)
+):
+    user = await get_current_user_from_cookie(request, db)
+    if not user or user.role != "deanery":
+        raise HTTPException(status_code=403, detail="Access denied")
+    if status not in DORMITORY_REQUEST_STATUSES:
+        raise HTTPException(status_code=400, detail="Unknown status")
+    
+    changed, results = await set_status(
+        db, DormitoryRequest, ids, status, DormitoryRequest.user_id, DormitoryRequest.processed_at
+    )
+    records_changed("dormitory_request", changed, status)
+    return batch_response(request, "/dormitory/admin", status, results)
+
 # ========== ДОКУМЕНТЫ ==========
 
 @app.get("/documents", response_class=HTMLResponse)
-async def documents_page(request: Request, db: Session = Depends(get_db)):
-    user = get_current_user_from_cookie(request, db)
+async def documents_page(request: Request, db: AsyncSession = Depends(get_db)):
+    user = await get_current_user_from_cookie(request, db)
     if not user:
         return RedirectResponse(url="/login", status_code=303)
     
-    docs = db.query(Document).filter(
-        Document.user_id == user.id
-    ).order_by(Document.created_at.desc()).all()
+    docs = (await db.scalars(
+        select(Document).where(
+            Document.user_id == user.id
+        ).order_by(Document.created_at.desc())
+    )).all()
     
     return templates.TemplateResponse("documents.html", {
         "request": request,
@@ -376,9 +634,9 @@ async def create_document(
     request: Request,
     document_type: str = Form(...),
     description: str = Form(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = get_current_user_from_cookie(request, db)
+    user = await get_current_user_from_cookie(request, db)
     if not user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
@@ -389,21 +647,37 @@ async def create_document(
         status="pending"
     )
     db.add(doc)
-    db.commit()
+    await db.commit()
+    record_changed("document", doc.id, user.id, "pending")
     return RedirectResponse(url="/documents", status_code=303)
 
 @app.get("/documents/admin", response_class=HTMLResponse)
-async def documents_admin(request: Request, db: Session = Depends(get_db)):
-    user = get_current_user_from_cookie(request, db)
+async def documents_admin(
+    request: Request,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    user = await get_current_user_from_cookie(request, db)
     if not user or user.role != "deanery":
         raise HTTPException(status_code=403, detail="Access denied")
     
-    all_docs = db.query(Document).order_by(Document.created_at.desc()).all()
+    if status and status not in DOCUMENT_STATUSES:
+        raise HTTPException(status_code=400, detail="Unknown status")
+    
+    stmt = select(Document).options(joinedload(Document.user))
+    if status:
+        stmt = stmt.where(Document.status == status)
+    page, next_cursor = await keyset_page(db, stmt, Document, cursor, limit)
     
-    return templates.TemplateResponse("documents_admin.html", {
+    return stream_template("documents_admin.html", {
         "request": request,
         "user": user,
-        "documents": all_docs
+        "documents": page,
+        "status": status,
+        "cursor": cursor,
+        "next_cursor": next_cursor
     })
 
 @app.post("/documents/update/{doc_id}")
@@ -411,91 +685,197 @@ async def update_document(
     request: Request,
     doc_id: int,
     status: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = get_current_user_from_cookie(request, db)
+    user = await get_current_user_from_cookie(request, db)
     if not user or user.role != "deanery":
         raise HTTPException(status_code=403, detail="Access denied")
     
-    doc = db.query(Document).filter(Document.id == doc_id).first()
+    doc = await db.get(Document, doc_id)
     if doc:
         doc.status = status
         doc.processed_at = datetime.utcnow()
-        db.commit()
+        await db.commit()
+        record_changed("document", doc.id, doc.user_id, status)
     
     return RedirectResponse(url="/documents/admin", status_code=303)
 
+@app.post("/documents/batch")
+async def batch_update_documents(
+    request: Request,
+    status: str = Form(...),
+    ids: List[int] = Form([]),
+    db: AsyncSession = Depends(get_db)
+):
+    user = await get_current_user_from_cookie(request, db)
+    if not user or user.role != "deanery":
+        raise HTTPException(status_code=403, detail="Access denied")
+    if status not in DOCUMENT_STATUSES:
+        raise HTTPException(status_code=400, detail="Unknown status")
+    
+    changed, results = await set_status(db, Document, ids, status, Document.user_id, Document.processed_at)
+    records_changed("document", changed, status)
+    return batch_response(request, "/documents/admin", status, results)
+
 # ========== НОВОСТИ ==========
 
+async def approved_news_page(db: AsyncSession, cursor: Optional[str], limit: Optional[int]):
+    stmt = select(News).options(joinedload(News.author)).where(News.status == "approved")
+    return await keyset_page(db, stmt, News, cursor, limit)
+
 @app.get("/news", response_class=HTMLResponse)
-async def news_page(request: Request, db: Session = Depends(get_db)):
-    user = get_current_user_from_cookie(request, db)
+async def news_page(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    user = await get_current_user_from_cookie(request, db)
+    if not user:
+        return RedirectResponse(url="/login", status_code=303)
+    
+    variant = (user.role, cursor, limit)
+    cached = page_cache.get("news", variant)
+    if cached:
+        return page_cache.response(request, cached)
+    
+    approved_news, next_cursor = await approved_news_page(db, cursor, limit)
+    
+    html = templates.get_template("news.html").render({
+        "request": request,
+        "user": user,
+        "news": approved_news,
+        "cursor": cursor,
+        "next_cursor": next_cursor
+    })
+    return page_cache.response(request, page_cache.set("news", variant, html))
+
+@app.get("/news/feed")
+async def news_feed(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    user = await get_current_user_from_cookie(request, db)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    approved_news, next_cursor = await approved_news_page(db, cursor, limit)
+    
+    return JSONResponse({
+        "items": [
+            {
+                "id": item.id,
+                "title": item.title,
+                "description": item.description,
+                "photo_path": item.photo_path,
+                "photo_variants": item.photo_variants,
+                "author": item.author.full_name or item.author.username,
+                "created_at": item.created_at.isoformat()
+            }
+            for item in approved_news
+        ],
+        "next_cursor": next_cursor
+    })
+
+@app.get("/news/search", response_class=HTMLResponse)
+async def news_search_page(
+    request: Request,
+    q: str = "",
+    page: int = 1,
+    db: AsyncSession = Depends(get_db)
+):
+    user = await get_current_user_from_cookie(request, db)
     if not user:
         return RedirectResponse(url="/login", status_code=303)
     
-    approved_news = db.query(News).filter(
-        News.status == "approved"
-    ).order_by(News.created_at.desc()).all()
+    query = q.strip()
+    hits, has_next = await search_news(db, query, page) if query else ([], False)
     
-    return templates.TemplateResponse("news.html", {
+    return templates.TemplateResponse("news_search.html", {
         "request": request,
         "user": user,
-        "news": approved_news
+        "query": query,
+        "hits": hits,
+        "page": max(page, 1),
+        "has_next": has_next
     })
 
 @app.get("/news/create", response_class=HTMLResponse)
-async def create_news_page(request: Request, db: Session = Depends(get_db)):
-    user = get_current_user_from_cookie(request, db)
+async def create_news_page(request: Request, db: AsyncSession = Depends(get_db)):
+    user = await get_current_user_from_cookie(request, db)
     if not user:
         return RedirectResponse(url="/login", status_code=303)
     
     return templates.TemplateResponse("news_create.html", {"request": request, "user": user})
 
+async def attach_photo_variants(news_id: int, photo: StoredUpload):
+    """Строит уменьшенные копии фото после ответа; без них страницы показывают исходник."""
+    try:
+        variants = await image_pool.run(build_derivatives, photo.url, photo.digest)
+    except PoolSaturated:
+        print(f"Копии фото новости {news_id} не построены: очередь обработки заполнена")
+        return
+    except Exception as e:
+        print(f"Копии фото новости {news_id} не построены: {e}")
+        return
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(News).where(News.id == news_id).values(photo_variants=variants))
+        await db.commit()
+    page_cache.invalidate("news")
+
 @app.post("/news/create")
 async def create_news(
     request: Request,
+    background_tasks: BackgroundTasks,
     title: str = Form(...),
     description: str = Form(...),
     photo: UploadFile = File(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = get_current_user_from_cookie(request, db)
+    user = await get_current_user_from_cookie(request, db)
     if not user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
-    photo_path = None
-    if photo:
-        filename = f"news_{int(datetime.now().timestamp())}_{photo.filename}"
-        file_path = f"uploads/{filename}"
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(photo.file, buffer)
-        photo_path = f"/uploads/{filename}"
+    stored = None
+    if has_file(photo):
+        stored = await save_upload(photo)
     
     news = News(
         title=title,
         description=description,
-        photo_path=photo_path,
+        photo_path=stored.url if stored else None,
         author_id=user.id,
         status="pending"
     )
     db.add(news)
-    db.commit()
+    await db.commit()
+    record_changed("news", news.id, user.id, "pending")
+    if stored:
+        background_tasks.add_task(attach_photo_variants, news.id, stored)
     return RedirectResponse(url="/news", status_code=303)
 
 @app.get("/news/admin", response_class=HTMLResponse)
-async def news_admin(request: Request, db: Session = Depends(get_db)):
-    user = get_current_user_from_cookie(request, db)
+async def news_admin(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    user = await get_current_user_from_cookie(request, db)
     if not user or user.role != "deanery":
         raise HTTPException(status_code=403, detail="Access denied")
     
-    pending_news = db.query(News).filter(
-        News.status == "pending"
-    ).order_by(News.created_at.desc()).all()
+    stmt = select(News).options(joinedload(News.author)).where(News.status == "pending")
+    pending_news, next_cursor = await keyset_page(db, stmt, News, cursor, limit)
     
-    return templates.TemplateResponse("news_admin.html", {
+    return stream_template("news_admin.html", {
         "request": request,
         "user": user,
-        "news": pending_news
+        "news": pending_news,
+        "cursor": cursor,
+        "next_cursor": next_cursor
     })
 
 @app.post("/news/update/{news_id}")
@@ -503,30 +883,56 @@ async def update_news(
     request: Request,
     news_id: int,
     status: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = get_current_user_from_cookie(request, db)
+    user = await get_current_user_from_cookie(request, db)
     if not user or user.role != "deanery":
         raise HTTPException(status_code=403, detail="Access denied")
     
-    news = db.query(News).filter(News.id == news_id).first()
+    news = await db.get(News, news_id)
     if news:
         news.status = status
         if status == "approved":
             news.approved_at = datetime.utcnow()
-        db.commit()
+        await db.commit()
+        page_cache.invalidate("news")
+        record_changed("news", news.id, news.author_id, status)
     
     return RedirectResponse(url="/news/admin", status_code=303)
 
+@app.post("/news/batch")
+async def batch_update_news(
+    request: Request,
+    status: str = Form(...),
+    ids: List[int] = Form([]),
+    db: AsyncSession = Depends(get_db)
+):
+    user = await get_current_user_from_cookie(request, db)
+    if not user or user.role != "deanery":
+        raise HTTPException(status_code=403, detail="Access denied")
+    if status not in NEWS_STATUSES:
+        raise HTTPException(status_code=400, detail="Unknown status")
+    
+    # Индекс поиска обновляют триггеры на смену статуса, кэш ленты сбрасывается один раз на пакет
+    changed, results = await set_status(
+        db, News, ids, status, News.author_id, News.approved_at if status == "approved" else None
+    )
+    if changed:
+        page_cache.invalidate("news")
+    records_changed("news", changed, status)
+    return batch_response(request, "/news/admin", status, results)
+
 # ========== ПРЕПОДАВАТЕЛЬ ==========
 
 @app.get("/teacher", response_class=HTMLResponse)
-async def teacher_page(request: Request, db: Session = Depends(get_db)):
-    user = get_current_user_from_cookie(request, db)
+async def teacher_page(request: Request, db: AsyncSession = Depends(get_db)):
+    user = await get_current_user_from_cookie(request, db)
     if not user or user.role != "teacher":
         raise HTTPException(status_code=403, detail="Access denied")
     
-    groups = db.query(Group).filter(Group.teacher_id == user.id).all()
+    groups = (await db.scalars(
+        select(Group).options(selectinload(Group.students)).where(Group.teacher_id == user.id)
+    )).all()
     
     return templates.TemplateResponse("teacher.html", {
         "request": request,
@@ -538,48 +944,130 @@ async def teacher_page(request: Request, db: Session = Depends(get_db)):
 async def create_group(
     request: Request,
     name: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = get_current_user_from_cookie(request, db)
+    user = await get_current_user_from_cookie(request, db)
     if not user or user.role != "teacher":
         raise HTTPException(status_code=403, detail="Access denied")
     
     group = Group(name=name, teacher_id=user.id)
     db.add(group)
-    db.commit()
+    await db.commit()
     return RedirectResponse(url="/teacher", status_code=303)
 
 @app.get("/teacher/group/{group_id}", response_class=HTMLResponse)
 async def group_detail(
     request: Request,
     group_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = get_current_user_from_cookie(request, db)
+    user = await get_current_user_from_cookie(request, db)
     if not user or user.role != "teacher":
         raise HTTPException(status_code=403, detail="Access denied")
     
-    group = db.query(Group).filter(Group.id == group_id).first()
+    group = await db.get(Group, group_id)
     if not group or group.teacher_id != user.id:
         raise HTTPException(status_code=404, detail="Group not found")
     
-    students = db.query(User).join(GroupStudent).filter(
-        GroupStudent.group_id == group_id
-    ).all()
+    students = (await db.scalars(
+        select(User).join(GroupStudent, GroupStudent.student_id == User.id).where(
+            GroupStudent.group_id == group_id
+        )
+    )).all()
     
-    all_students = db.query(User).filter(User.role == "student").all()
+    attendance = (await db.scalars(
+        select(AttendanceRecord).options(joinedload(AttendanceRecord.student)).where(
+            AttendanceRecord.group_id == group_id
+        ).order_by(AttendanceRecord.date.desc()).limit(50)
+    )).all()
     
-    attendance = db.query(AttendanceRecord).filter(
-        AttendanceRecord.group_id == group_id
-    ).order_by(AttendanceRecord.date.desc()).limit(50).all()
+    summaries = {summary.student_id: summary for summary in (await db.scalars(
+        select(StudentAttendanceSummary).where(StudentAttendanceSummary.group_id == group_id)
+    )).all()}
     
     return templates.TemplateResponse("group_detail.html", {
         "request": request,
         "user": user,
         "group": group,
         "students": students,
-        "all_students": all_students,
-        "attendance": attendance
+        "attendance": attendance,
+        "summaries": summaries
+    })
+
+# Поиск пользователей для выбора в формах (typeahead)
+USER_SEARCH_LIMIT = 10
+USER_SEARCH_MAX_LIMIT = 20
+
+async def search_users(db: AsyncSession, query: str, role: str, limit: int):
+    """Пользователи роли role, у которых ФИО или логин начинаются с query.
+
+    Каждое условие - диапазон по индексу (role, search_key) или (role, username) с LIMIT,
+    поэтому запрос читает порядка limit строк при любом числе пользователей.
+    """
+    key = search_key(query)
+    if not key:
+        return []
+    # Строки с префиксом key лежат в диапазоне [key, key + максимальный символ)
+    upper = key + "\U0010ffff"
+    columns = (User.id, User.username, User.full_name)
+    by_name = (await db.execute(
+        select(*columns).where(User.role == role, User.search_key >= key, User.search_key < upper)
+        .order_by(User.search_key, User.id).limit(limit)
+    )).all()
+    by_username = (await db.execute(
+        select(*columns).where(User.role == role, User.username >= key, User.username < upper)
+        .order_by(User.username).limit(limit)
+    )).all()
+    found = {}
+    for row in [*by_name, *by_username]:
+        found.setdefault(row.id, row)
+    return list(found.values())[:limit]
+
+@app.get("/users/search")
+async def users_search(
+    request: Request,
+    q: str = "",
+    role: str = "student",
+    group_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    user = await get_current_user_from_cookie(request, db)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    if role not in ["student", "teacher", "deanery"]:
+        raise HTTPException(status_code=400, detail="Invalid role")
+    # Преподаватель ищет только студентов, деканат - пользователей любой роли
+    if user.role == "student" or (user.role == "teacher" and role != "student"):
+        raise HTTPException(status_code=403, detail="Access denied")
+    # Состав группы виден только ее преподавателю и деканату
+    if group_id is not None:
+        group = await db.get(Group, group_id)
+        if not group or (user.role != "deanery" and group.teacher_id != user.id):
+            raise HTTPException(status_code=404, detail="Group not found")
+    
+    limit = min(max(limit or USER_SEARCH_LIMIT, 1), USER_SEARCH_MAX_LIMIT)
+    rows = await search_users(db, q, role, limit)
+    
+    in_group = set()
+    if group_id is not None and rows:
+        in_group = set((await db.scalars(
+            select(GroupStudent.student_id).where(
+                GroupStudent.group_id == group_id,
+                GroupStudent.student_id.in_([row.id for row in rows])
+            )
+        )).all())
+    
+    return JSONResponse({
+        "items": [
+            {
+                "id": row.id,
+                "username": row.username,
+                "full_name": row.full_name,
+                "in_group": row.id in in_group
+            }
+            for row in rows
+        ]
     })
 
 @app.post("/teacher/group/{group_id}/add_student")
@@ -587,28 +1075,50 @@ async def add_student_to_group(
     request: Request,
     group_id: int,
     student_id: int = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = get_current_user_from_cookie(request, db)
+    user = await get_current_user_from_cookie(request, db)
     if not user or user.role != "teacher":
         raise HTTPException(status_code=403, detail="Access denied")
     
-    group = db.query(Group).filter(Group.id == group_id).first()
+    group = await db.get(Group, group_id)
     if not group or group.teacher_id != user.id:
         raise HTTPException(status_code=404, detail="Group not found")
     
-    existing = db.query(GroupStudent).filter(
-        GroupStudent.group_id == group_id,
-        GroupStudent.student_id == student_id
-    ).first()
+    student = await db.get(User, student_id)
+    if not student or student.role != "student":
+        raise HTTPException(status_code=404, detail="Student not found")
+    
+    existing = await db.scalar(
+        select(GroupStudent).where(
+            GroupStudent.group_id == group_id,
+            GroupStudent.student_id == student_id
+        )
+    )
     
     if not existing:
         group_student = GroupStudent(group_id=group_id, student_id=student_id)
         db.add(group_student)
-        db.commit()
+        try:
+            await db.commit()
+        except IntegrityError:
+            # Студента добавил параллельный запрос (уникальный индекс group_id, student_id)
+            await db.rollback()
     
     return RedirectResponse(url=f"/teacher/group/{group_id}", status_code=303)
 
+def parse_attendance_date(date: str) -> datetime:
+    # Безопасный парсинг даты
+    if 'T' in date:
+        return datetime.fromisoformat(date.replace('Z', '+00:00'))
+    # Пробуем разные форматы
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M'):
+        try:
+            return datetime.strptime(date, fmt)
+        except ValueError:
+            pass
+    return datetime.strptime(date, '%Y-%m-%d')
+
 @app.post("/teacher/attendance")
 async def mark_attendance(
     request: Request,
@@ -617,45 +1127,28 @@ async def mark_attendance(
     date: str = Form(...),
     present: bool = Form(False),
     notes: str = Form(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     try:
-        user = get_current_user_from_cookie(request, db)
+        user = await get_current_user_from_cookie(request, db)
         if not user or user.role != "teacher":
             raise HTTPException(status_code=403, detail="Access denied")
         
-        group = db.query(Group).filter(Group.id == group_id).first()
+        group = await db.get(Group, group_id)
         if not group or group.teacher_id != user.id:
             raise HTTPException(status_code=404, detail="Group not found")
         
-        # Безопасный парсинг даты
         try:
-            if 'T' in date:
-                parsed_date = datetime.fromisoformat(date.replace('Z', '+00:00'))
-            else:
-                # Пробуем разные форматы
-                try:
-                    parsed_date = datetime.strptime(date, '%Y-%m-%d %H:%M:%S')
-                except:
-                    try:
-                        parsed_date = datetime.strptime(date, '%Y-%m-%d %H:%M')
-                    except:
-                        parsed_date = datetime.strptime(date, '%Y-%m-%d')
+            parsed_date = parse_attendance_date(date)
         except Exception as e:
             return templates.TemplateResponse("error.html", {
                 "request": request,
                 "error_message": f"Неверный формат даты. Используйте формат: ГГГГ-ММ-ДД ЧЧ:ММ"
             }, status_code=400)
         
-        attendance = AttendanceRecord(
-            group_id=group_id,
-            student_id=student_id,
-            date=parsed_date,
-            present=present,
-            notes=notes
-        )
-        db.add(attendance)
-        db.commit()
+        # Повторная отметка за то же занятие обновляет запись
+        await upsert_attendance(db, group_id, parsed_date, {student_id: (present, notes)})
+        await db.commit()
         
         return RedirectResponse(url=f"/teacher/group/{group_id}", status_code=303)
     except HTTPException:
@@ -666,6 +1159,93 @@ async def mark_attendance(
             "error_message": f"Ошибка при сохранении посещаемости: {str(e)}"
         }, status_code=500)
 
+@app.post("/teacher/group/{group_id}/attendance")
+async def mark_group_attendance(
+    request: Request,
+    group_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """Отмечает посещаемость всей группы за одно занятие одной транзакцией.
+
+    Повторная отправка за ту же дату обновляет существующие записи.
+    """
+    user = await get_current_user_from_cookie(request, db)
+    if not user or user.role != "teacher":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    group = await db.get(Group, group_id)
+    if not group or group.teacher_id != user.id:
+        raise HTTPException(status_code=404, detail="Group not found")
+    
+    form = await request.form()
+    try:
+        parsed_date = parse_attendance_date(form.get("date", ""))
+        student_ids = {int(student_id) for student_id in form.getlist("student_ids")}
+    except Exception:
+        return templates.TemplateResponse("error.html", {
+            "request": request,
+            "error_message": "Неверный формат даты. Используйте формат: ГГГГ-ММ-ДД ЧЧ:ММ"
+        }, status_code=400)
+    
+    if student_ids:
+        members = set((await db.scalars(
+            select(GroupStudent.student_id).where(
+                GroupStudent.group_id == group_id,
+                GroupStudent.student_id.in_(student_ids)
+            )
+        )).all())
+        if members != student_ids:
+            raise HTTPException(status_code=400, detail="Students are not members of this group")
+        
+        await upsert_attendance(db, group_id, parsed_date, {
+            student_id: (form.get(f"present_{student_id}") is not None, form.get(f"notes_{student_id}") or None)
+            for student_id in student_ids
+        })
+        await db.commit()
+    
+    return RedirectResponse(url=f"/teacher/group/{group_id}", status_code=303)
+
+# ========== ОТЧЕТЫ ==========
+
+@app.get("/attendance/report", response_class=HTMLResponse)
+async def attendance_report(
+    request: Request,
+    group_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    user = await get_current_user_from_cookie(request, db)
+    if not user or user.role != "deanery":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    if group_id is None:
+        groups = (await db.execute(
+            select(Group, GroupAttendanceSummary).outerjoin(
+                GroupAttendanceSummary, GroupAttendanceSummary.group_id == Group.id
+            ).options(joinedload(Group.teacher)).order_by(Group.name)
+        )).all()
+        return templates.TemplateResponse("attendance_report.html", {
+            "request": request,
+            "user": user,
+            "groups": groups
+        })
+    
+    group = await db.get(Group, group_id)
+    if not group:
+        raise HTTPException(status_code=404, detail="Group not found")
+    
+    students = (await db.scalars(
+        select(StudentAttendanceSummary).options(joinedload(StudentAttendanceSummary.student)).where(
+            StudentAttendanceSummary.group_id == group_id
+        ).order_by(StudentAttendanceSummary.presents * 1.0 / StudentAttendanceSummary.sessions)
+    )).all()
+    
+    return templates.TemplateResponse("attendance_report.html", {
+        "request": request,
+        "user": user,
+        "group": group,
+        "students": students
+    })
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,270 @@
+"""Метрики приложения в текстовом формате Prometheus (/metrics).
+
+По шаблону маршрута ("/teacher/group/{group_id}", а не конкретный URL): число
+запросов по статусам, гистограммы времени ответа, числа SQL-запросов и времени в
+БД на запрос. Кроме того - ожидание соединения из пула и время отрисовки шаблонов.
+Все значения хранятся в памяти своего воркера; при нескольких воркерах Prometheus
+опрашивает каждый (или суммирует по instance).
+"""
+from sqlalchemy import event
+from jinja2 import Template
+from bisect import bisect_left
+from contextvars import ContextVar
+import os
+import threading
+import time
+
+# Токен для сборщика метрик (заголовок Authorization: Bearer <токен>); без него /metrics видит только деканат
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+RENDER_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5)
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами; значения по наборам меток."""
+
+    def __init__(self, name: str, help_text: str, labels: tuple, buckets: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values: tuple, value: float):
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][position] += 1
+            series[1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for label_values, counts, total in sorted(series):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                yield _sample(f"{self.name}_bucket", self.labels + ("le",), label_values + (bound,), cumulative)
+            yield _sample(f"{self.name}_sum", self.labels, label_values, total)
+            yield _sample(f"{self.name}_count", self.labels, label_values, cumulative)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values: tuple, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield _sample(self.name, self.labels, label_values, value)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _sample(name: str, labels: tuple, values: tuple, value) -> str:
+    if not labels:
+        return f"{name} {value}"
+    pairs = ",".join(f'{label}="{_escape(label_value)}"' for label, label_value in zip(labels, values))
+    return f"{name}{{{pairs}}} {value}"
+
+
+requests_total = Counter("http_requests_total", "Запросы по маршруту и статусу", ("method", "route", "status"))
+request_duration = Histogram(
+    "http_request_duration_seconds", "Время ответа до последнего байта", ("method", "route"), LATENCY_BUCKETS
+)
+request_queries = Histogram(
+    "db_queries_per_request", "SQL-запросов на один HTTP-запрос", ("method", "route"), QUERY_COUNT_BUCKETS
+)
+request_db_time = Histogram(
+    "db_time_per_request_seconds", "Время выполнения SQL за один HTTP-запрос", ("method", "route"), DB_TIME_BUCKETS
+)
+pool_wait = Histogram(
+    "db_pool_checkout_wait_seconds", "Ожидание соединения из пула", ("engine",), WAIT_BUCKETS
+)
+template_render = Histogram(
+    "template_render_seconds", "Время отрисовки шаблона", ("template",), RENDER_BUCKETS
+)
+
+_pools = {}
+_gauges_registered = []
+_in_progress = 0
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+_request_stats: ContextVar = ContextVar("request_stats", default=None)
+
+
+def route_label(scope) -> str:
+    """Шаблон пути вместо URL, чтобы число рядов метрик не зависело от id в адресах."""
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", "unmatched")
+    # Смонтированные приложения (/static, /uploads) сообщают только свой префикс
+    if "app_root_path" in scope:
+        return scope["root_path"][len(scope["app_root_path"]):] + "/{path}"
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """Считает запросы, время ответа и SQL каждого HTTP-запроса."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        global _in_progress
+        started = time.perf_counter()
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status = 500
+        streaming_events = False
+        _in_progress += 1
+
+        async def send_observed(message):
+            nonlocal status, streaming_events
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                streaming_events = any(
+                    name == b"content-type" and value.startswith(b"text/event-stream")
+                    for name, value in message.get("headers", [])
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_observed)
+        finally:
+            _in_progress -= 1
+            _request_stats.reset(token)
+            labels = (scope["method"], route_label(scope))
+            requests_total.inc(labels + (str(status),))
+            # Поток событий открыт минутами, его длительность исказила бы гистограмму времени ответа
+            if not streaming_events:
+                request_duration.observe(labels, time.perf_counter() - started)
+            request_queries.observe(labels, stats.queries)
+            request_db_time.observe(labels, stats.db_time)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _request_stats.get()
+    if stats is None or context is None:
+        return
+    stats.queries += 1
+    stats.db_time += time.perf_counter() - getattr(context, "_metrics_started", time.perf_counter())
+
+
+def instrument_engine(engine, name: str):
+    """Подключает счетчики SQL и замер ожидания соединения к синхронному движку (для async - engine.sync_engine)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    # У пула нет события "начали ждать соединение", поэтому замеряется сам вызов выдачи
+    pool = engine.pool
+    do_get = pool._do_get
+
+    def timed_do_get():
+        started = time.perf_counter()
+        try:
+            return do_get()
+        finally:
+            pool_wait.observe((name,), time.perf_counter() - started)
+
+    pool._do_get = timed_do_get
+    _pools[name] = pool
+
+
+class TimedTemplate(Template):
+    """Шаблон, который замеряет время render() и суммарное время генерации generate()."""
+
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            template_render.observe((self.name,), time.perf_counter() - started)
+
+    def generate(self, *args, **kwargs):
+        pieces = super().generate(*args, **kwargs)
+        elapsed = 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    piece = next(pieces)
+                except StopIteration:
+                    break
+                finally:
+                    elapsed += time.perf_counter() - started
+                yield piece
+        finally:
+            template_render.observe((self.name,), elapsed)
+
+
+def instrument_templates(templates):
+    """Вызывается до загрузки шаблонов: класс применяется к шаблонам, загруженным после."""
+    templates.env.template_class = TimedTemplate
+
+
+def register_gauge(name: str, help_text: str, read):
+    """Добавляет показатель другого модуля; read() вызывается при каждом опросе /metrics."""
+    _gauges_registered.append((name, help_text, read))
+
+
+def _gauges():
+    yield "# HELP http_requests_in_progress Запросы, которые обрабатываются сейчас"
+    yield "# TYPE http_requests_in_progress gauge"
+    yield f"http_requests_in_progress {_in_progress}"
+    yield "# HELP db_pool_checked_out Соединения, выданные из пула"
+    yield "# TYPE db_pool_checked_out gauge"
+    for name, pool in sorted(_pools.items()):
+        checked_out = pool.checkedout() if hasattr(pool, "checkedout") else 0
+        yield f'db_pool_checked_out{{engine="{name}"}} {checked_out}'
+    for name, help_text, read in _gauges_registered:
+        yield f"# HELP {name} {help_text}"
+        yield f"# TYPE {name} gauge"
+        yield f"{name} {read()}"
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in (requests_total, request_duration, request_queries, request_db_time, pool_wait, template_render):
+        lines.extend(metric.render())
+    lines.extend(_gauges())
+    return "\n".join(lines) + "\n"
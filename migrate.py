@@ -0,0 +1,233 @@
+"""Версионированные миграции схемы БД.
+
+Запускаются при развертывании, до старта приложения:
+
+    python migrate.py          # применить недостающие миграции
+    python migrate.py --list   # показать примененные и ожидающие миграции
+
+Каждая миграция выполняется в своей транзакции и записывается в schema_migrations.
+Миграции идемпотентны: база, созданная старым init_db(), доводится до той же схемы,
+что и новая.
+"""
+from sqlalchemy import inspect, text, select, update, bindparam
+from contextlib import contextmanager
+from datetime import datetime
+from database import engine, SQLITE_BUSY_TIMEOUT_MS
+from models import (
+    Base, User, Schedule, DormitoryRequest, Document, News, GroupStudent, AttendanceRecord,
+    DAYS_OF_WEEK, parse_time, search_key
+)
+from attendance_summary import refill_attendance_summaries
+from news_search import create_search_index
+from schedule_index import find_overlaps
+import os
+import sys
+
+# Сколько ждать миграций, которые выполняет другой процесс (SQLite)
+MIGRATION_LOCK_TIMEOUT_MS = int(os.getenv("MIGRATION_LOCK_TIMEOUT_MS", "600000"))
+# Ключ advisory-блокировки миграций в PostgreSQL
+MIGRATION_LOCK_KEY = 7_402_311
+
+
+def _has_column(connection, table: str, column: str) -> bool:
+    return column in {c["name"] for c in inspect(connection).get_columns(table)}
+
+
+def _add_column(connection, table: str, column: str, ddl: str):
+    if not _has_column(connection, table, column):
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _create_indexes(connection, model):
+    for index in model.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+
+def initial_schema(connection):
+    # Создает только отсутствующие таблицы; существующие дополняются следующими миграциями
+    Base.metadata.create_all(connection)
+
+
+def users_token_version(connection):
+    _add_column(connection, "users", "token_version", "INTEGER NOT NULL DEFAULT 0")
+
+
+def attendance_summaries(connection):
+    refill_attendance_summaries(connection)
+
+
+def schedule_slots(connection):
+    _add_column(connection, "schedules", "day_index", "INTEGER")
+    _add_column(connection, "schedules", "start_minute", "INTEGER")
+    _add_column(connection, "schedules", "end_minute", "INTEGER")
+    table = Schedule.__table__
+    rows = connection.execute(
+        select(table.c.id, table.c.day_of_week, table.c.time_start, table.c.time_end)
+        .where(table.c.day_index.is_(None))
+    ).all()
+    for schedule_id, day_of_week, time_start, time_end in rows:
+        try:
+            values = {
+                "day_index": DAYS_OF_WEEK.index(day_of_week),
+                "start_minute": parse_time(time_start),
+                "end_minute": parse_time(time_end),
+            }
+        except ValueError:
+            print(f"  пара {schedule_id}: не удалось разобрать день или время, пропущена")
+            continue
+        connection.execute(update(table).where(table.c.id == schedule_id).values(**values))
+    _create_indexes(connection, Schedule)
+    _report_schedule_overlaps(connection)
+
+
+def _report_schedule_overlaps(connection):
+    # Старая версия не проверяла пересечения; такие пары переносятся как есть, деканату нужно их развести
+    table = Schedule.__table__
+    rows = connection.execute(
+        select(
+            table.c.id, table.c.day_index, table.c.start_minute, table.c.end_minute,
+            table.c.room, table.c.teacher_name
+        ).where(table.c.day_index.is_not(None)).order_by(table.c.id)
+    ).all()
+    overlaps = find_overlaps(rows)
+    for schedule_id, other_id, kind in overlaps:
+        resource = "аудитории" if kind == "room" else "преподавателю"
+        print(f"  пара {schedule_id} пересекается с парой {other_id} по {resource}")
+    if overlaps:
+        print(f"  пересекающихся пар: {len(overlaps)}, их нужно развести вручную")
+
+
+def hot_path_indexes(connection):
+    # Перед уникальным индексом убираем повторные записи студента в группе
+    connection.execute(text(
+        "DELETE FROM group_students WHERE id NOT IN "
+        "(SELECT MIN(id) FROM group_students GROUP BY group_id, student_id)"
+    ))
+    for model in (DormitoryRequest, Document, News, GroupStudent, AttendanceRecord):
+        _create_indexes(connection, model)
+
+
+def news_photo_variants(connection):
+    _add_column(connection, "news", "photo_variants", "JSON")
+
+
+def users_search_key(connection):
+    if connection.dialect.name == "postgresql":
+        _add_column(connection, "users", "search_key", 'VARCHAR COLLATE "C"')
+    else:
+        _add_column(connection, "users", "search_key", "VARCHAR")
+    table = User.__table__
+    rows = connection.execute(
+        select(table.c.id, table.c.full_name)
+        .where(table.c.search_key.is_(None), table.c.full_name.is_not(None))
+    ).all()
+    values = [{"user_id": user_id, "key": search_key(full_name)} for user_id, full_name in rows]
+    if values:
+        connection.execute(
+            update(table).where(table.c.id == bindparam("user_id")).values(search_key=bindparam("key")),
+            values
+        )
+    _create_indexes(connection, User)
+
+
+def news_full_text_search(connection):
+    create_search_index(connection)
+
+
+def attendance_unique_marks(connection):
+    # Оставляем последнюю отметку студента за занятие; сводки пересчитываются без дублей
+    removed = connection.execute(text(
+        "DELETE FROM attendance_records WHERE id NOT IN "
+        "(SELECT MAX(id) FROM attendance_records GROUP BY group_id, student_id, date)"
+    )).rowcount
+    if removed:
+        print(f"  удалено повторных отметок посещаемости: {removed}")
+    _create_indexes(connection, AttendanceRecord)
+    refill_attendance_summaries(connection)
+
+
+MIGRATIONS = [
+    ("0001_initial_schema", initial_schema),
+    ("0002_users_token_version", users_token_version),
+    ("0003_attendance_summaries", attendance_summaries),
+    ("0004_schedule_slots", schedule_slots),
+    ("0005_hot_path_indexes", hot_path_indexes),
+    ("0006_news_photo_variants", news_photo_variants),
+    ("0007_users_search_key", users_search_key),
+    ("0008_news_full_text_search", news_full_text_search),
+    ("0009_attendance_unique_marks", attendance_unique_marks),
+]
+
+
+def _ensure_version_table(connection):
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version VARCHAR(255) PRIMARY KEY, applied_at TIMESTAMP NOT NULL)"
+    ))
+
+
+def applied_versions(bind=engine):
+    with bind.begin() as connection:
+        _ensure_version_table(connection)
+        return _read_versions(connection)
+
+
+def _read_versions(connection):
+    return {row[0] for row in connection.execute(text("SELECT version FROM schema_migrations"))}
+
+
+@contextmanager
+def _locked_transaction(bind):
+    """Транзакция, которую в каждый момент выполняет только один процесс.
+
+    Несколько реплик, стартующих одновременно, иначе применили бы одну миграцию
+    дважды. В PostgreSQL берется транзакционная advisory-блокировка, в SQLite -
+    BEGIN IMMEDIATE (блокировка записи); остальные процессы ждут ее освобождения.
+    """
+    if bind.dialect.name == "sqlite":
+        # Драйвер в режиме AUTOCOMMIT не начинает транзакцию сам, BEGIN IMMEDIATE выдается явно
+        with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.exec_driver_sql(f"PRAGMA busy_timeout={MIGRATION_LOCK_TIMEOUT_MS}")
+            try:
+                connection.exec_driver_sql("BEGIN IMMEDIATE")
+                try:
+                    yield connection
+                except BaseException:
+                    connection.exec_driver_sql("ROLLBACK")
+                    raise
+                connection.exec_driver_sql("COMMIT")
+            finally:
+                connection.exec_driver_sql(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    else:
+        with bind.begin() as connection:
+            if bind.dialect.name == "postgresql":
+                connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            yield connection
+
+
+def run_migrations(bind=engine):
+    applied = []
+    for version, migration in MIGRATIONS:
+        with _locked_transaction(bind) as connection:
+            # Список примененных читается под блокировкой: миграцию мог применить другой процесс
+            _ensure_version_table(connection)
+            if version in _read_versions(connection):
+                continue
+            migration(connection)
+            connection.execute(
+                text("INSERT INTO schema_migrations (version, applied_at) VALUES (:version, :applied_at)"),
+                {"version": version, "applied_at": datetime.utcnow()}
+            )
+        print(f"Применена миграция {version}")
+        applied.append(version)
+    return applied
+
+
+if __name__ == "__main__":
+    if "--list" in sys.argv:
+        done = applied_versions()
+        for version, _ in MIGRATIONS:
+            print(f"[{'x' if version in done else ' '}] {version}")
+    else:
+        applied = run_migrations()
+        print(f"Схема БД актуальна (применено миграций: {len(applied)}).")
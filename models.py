@@ -1,12 +1,35 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Float
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Float, UniqueConstraint, Index, JSON
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, validates
 from datetime import datetime
 
 Base = declarative_base()
 
+DORMITORY_REQUEST_STATUSES = ["pending", "approved", "rejected", "completed"]
+DOCUMENT_STATUSES = ["pending", "approved", "rejected", "issued"]
+NEWS_STATUSES = ["pending", "approved", "rejected"]
+DAYS_OF_WEEK = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+def parse_time(value: str) -> int:
+    """Переводит "HH:MM" в минуты от начала суток."""
+    hours, minutes = value.strip().split(":")
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f"Неверное время: {value}")
+    return hours * 60 + minutes
+
+def search_key(value):
+    """Ключ поиска по префиксу: без регистра, ё как е, одиночные пробелы."""
+    if not value or not value.strip():
+        return None
+    return " ".join(value.split()).casefold().replace("ё", "е")
+
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_role_search_key", "role", "search_key"),
+        Index("ix_users_role_username", "role", "username"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True, index=True, nullable=False)
@@ -14,7 +37,10 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     role = Column(String, nullable=False)  # student, teacher, deanery
     full_name = Column(String, nullable=True)
+    # Заполняется автоматически из full_name; в PostgreSQL с побайтовым сравнением, чтобы поиск по диапазону находил все префиксы
+    search_key = Column(String().with_variant(String(collation="C"), "postgresql"), nullable=True)
     is_active = Column(Boolean, default=True)
+    token_version = Column(Integer, nullable=False, default=0)  # увеличивается при смене роли, блокировке и выходе
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -24,24 +50,56 @@ class User(Base):
     news = relationship("News", back_populates="author")
     attendance_records = relationship("AttendanceRecord", back_populates="student")
     groups = relationship("Group", back_populates="teacher")
+    
+    @validates("full_name")
+    def _set_search_key(self, key, value):
+        self.search_key = search_key(value)
+        return value
 
 class Schedule(Base):
     __tablename__ = "schedules"
+    __table_args__ = (Index("ix_schedules_day_start", "day_index", "start_minute"),)
     
     id = Column(Integer, primary_key=True, index=True)
     subject = Column(String, nullable=False)
     day_of_week = Column(String, nullable=False)  # Monday, Tuesday, etc.
     time_start = Column(String, nullable=False)  # HH:MM
     time_end = Column(String, nullable=False)  # HH:MM
+    # Нормализованные значения заполняются автоматически из строковых полей
+    day_index = Column(Integer, nullable=True)  # 0 - Monday
+    start_minute = Column(Integer, nullable=True)  # минуты от начала суток
+    end_minute = Column(Integer, nullable=True)
     room = Column(String, nullable=True)
     teacher_name = Column(String, nullable=True)
     created_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     
     created_by_user = relationship("User", back_populates="schedules")
+    
+    @validates("day_of_week")
+    def _set_day_index(self, key, value):
+        if value not in DAYS_OF_WEEK:
+            raise ValueError(f"Неверный день недели: {value}")
+        self.day_index = DAYS_OF_WEEK.index(value)
+        return value
+    
+    @validates("time_start")
+    def _set_start_minute(self, key, value):
+        self.start_minute = parse_time(value)
+        return value
+    
+    @validates("time_end")
+    def _set_end_minute(self, key, value):
+        self.end_minute = parse_time(value)
+        return value
 
 class DormitoryRequest(Base):
     __tablename__ = "dormitory_requests"
+    __table_args__ = (
+        Index("ix_dormitory_requests_user_created", "user_id", "created_at"),
+        Index("ix_dormitory_requests_status_created", "status", "created_at"),
+        Index("ix_dormitory_requests_created", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -55,6 +113,11 @@ class DormitoryRequest(Base):
 
 class Document(Base):
     __tablename__ = "documents"
+    __table_args__ = (
+        Index("ix_documents_user_created", "user_id", "created_at"),
+        Index("ix_documents_status_created", "status", "created_at"),
+        Index("ix_documents_created", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -68,11 +131,13 @@ class Document(Base):
 
 class News(Base):
     __tablename__ = "news"
+    __table_args__ = (Index("ix_news_status_created", "status", "created_at"),)
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
     description = Column(Text, nullable=False)
     photo_path = Column(String, nullable=True)
+    photo_variants = Column(JSON, nullable=True)  # уменьшенные копии фото: {"webp": [[url, ширина], ...], "jpeg": [...], ...}
     author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     status = Column(String, default="pending")  # pending, approved, rejected
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -94,6 +159,7 @@ class Group(Base):
 
 class GroupStudent(Base):
     __tablename__ = "group_students"
+    __table_args__ = (Index("uq_group_students_group_student", "group_id", "student_id", unique=True),)
     
     id = Column(Integer, primary_key=True, index=True)
     group_id = Column(Integer, ForeignKey("groups.id"), nullable=False)
@@ -105,6 +171,11 @@ class GroupStudent(Base):
 
 class AttendanceRecord(Base):
     __tablename__ = "attendance_records"
+    __table_args__ = (
+        Index("ix_attendance_records_group_date", "group_id", "date"),
+        # Одна отметка студента за занятие: повторная отправка обновляет ее (см. upsert_attendance)
+        Index("ux_attendance_records_group_student_date", "group_id", "student_id", "date", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     group_id = Column(Integer, ForeignKey("groups.id"), nullable=False)
@@ -117,3 +188,36 @@ class AttendanceRecord(Base):
     group = relationship("Group", back_populates="attendance_records")
     student = relationship("User", back_populates="attendance_records")
 
+class StudentAttendanceSummary(Base):
+    """Посещаемость студента в группе, обновляется при каждой записи в attendance_records."""
+    __tablename__ = "student_attendance_summaries"
+    __table_args__ = (UniqueConstraint("group_id", "student_id"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    group_id = Column(Integer, ForeignKey("groups.id"), nullable=False)
+    student_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    sessions = Column(Integer, nullable=False, default=0)  # число отметок
+    presents = Column(Integer, nullable=False, default=0)
+    last_seen = Column(DateTime, nullable=True)  # последнее занятие, на котором студент присутствовал
+    
+    group = relationship("Group")
+    student = relationship("User")
+    
+    @property
+    def rate(self):
+        return self.presents / self.sessions if self.sessions else None
+
+class GroupAttendanceSummary(Base):
+    """Посещаемость группы целиком: сумма по всем отметкам студентов группы."""
+    __tablename__ = "group_attendance_summaries"
+    
+    group_id = Column(Integer, ForeignKey("groups.id"), primary_key=True)
+    sessions = Column(Integer, nullable=False, default=0)
+    presents = Column(Integer, nullable=False, default=0)
+    last_seen = Column(DateTime, nullable=True)
+    
+    group = relationship("Group")
+    
+    @property
+    def rate(self):
+        return self.presents / self.sessions if self.sessions else None
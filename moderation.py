@@ -0,0 +1,62 @@
+"""Пакетная модерация очередей деканата: заявки общежития, документы, новости.
+
+Пакет выполняется одним UPDATE ... WHERE id IN (...) в одной транзакции; измененные
+записи возвращает RETURNING (там, где СУБД его поддерживает), поэтому сброс кэша и
+события для страниц отправляются один раз на пакет, а не на каждую запись.
+"""
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse, RedirectResponse
+from sqlalchemy import select, update, or_
+from datetime import datetime
+
+BATCH_MAX_ITEMS = 500
+
+
+async def set_status(db, model, ids: list, status: str, owner_column, stamp_column=None):
+    """Устанавливает status записям ids; stamp_column (processed_at, approved_at) получает текущее время.
+
+    Записи, у которых статус уже такой, не меняются. Возвращает (changed, results):
+    changed - {id: владелец} измененных записей, results - результат по каждому
+    запрошенному id: updated, unchanged или not_found.
+    """
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise HTTPException(status_code=400, detail="No items selected")
+    if len(ids) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Too many items (max {BATCH_MAX_ITEMS})")
+
+    values = {"status": status}
+    if stamp_column is not None:
+        values[stamp_column.key] = datetime.utcnow()
+    condition = (model.id.in_(ids), or_(model.status.is_(None), model.status != status))
+    stmt = update(model).where(*condition).values(**values).execution_options(synchronize_session=False)
+    if db.bind.dialect.update_returning:
+        rows = (await db.execute(stmt.returning(model.id, owner_column))).all()
+    else:
+        # Без RETURNING измененные записи выбираются в той же транзакции до обновления
+        rows = (await db.execute(select(model.id, owner_column).where(*condition).with_for_update())).all()
+        await db.execute(stmt)
+    changed = {item_id: owner_id for item_id, owner_id in rows}
+
+    existing = set(changed)
+    missing = [item_id for item_id in ids if item_id not in changed]
+    if missing:
+        existing.update((await db.scalars(select(model.id).where(model.id.in_(missing)))).all())
+    await db.commit()
+
+    results = [
+        {"id": item_id, "result": "updated" if item_id in changed else "unchanged" if item_id in existing else "not_found"}
+        for item_id in ids
+    ]
+    return changed, results
+
+
+def batch_response(request: Request, redirect_url: str, status: str, results: list):
+    """JSON с результатами по записям для страницы со скриптом, иначе - возврат на страницу очереди."""
+    if "application/json" in request.headers.get("accept", ""):
+        return JSONResponse({
+            "status": status,
+            "updated": sum(1 for item in results if item["result"] == "updated"),
+            "results": results
+        })
+    return RedirectResponse(url=redirect_url, status_code=303)
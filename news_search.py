@@ -0,0 +1,211 @@
+"""Полнотекстовый поиск по одобренным новостям.
+
+SQLite: таблица FTS5 news_fts с внешним содержимым - представлением одобренных
+новостей; ее ведут триггеры на вставку, изменение и удаление news, поэтому смена
+статуса модератором сразу добавляет новость в индекс или убирает из него.
+Токенизатор unicode61 не знает русской морфологии: слова запроса приводятся к основе
+стеммером Snowball и ищутся как префиксы («студентов» -> студент*). Совпадения в заголовке и фрагмент
+текста размечаются в Python только для новостей страницы: snippet() в запросе
+считался бы для каждой найденной новости до сортировки.
+
+PostgreSQL: вычисляемый столбец tsvector с конфигурацией russian и частичный
+GIN-индекс по одобренным новостям.
+"""
+from sqlalchemy import text, select, or_
+from sqlalchemy.orm import joinedload
+from markupsafe import Markup, escape
+from collections import namedtuple
+from models import News
+import re
+
+try:
+    import snowballstemmer
+except ImportError:  # без стеммера слова ищутся как префиксы целиком
+    snowballstemmer = None
+
+NEWS_SEARCH_PAGE_SIZE = 20
+# Основа короче этого ищется по самому слову: префикс «нов*» нашел бы почти все новости
+MIN_STEM_LENGTH = 4
+MAX_QUERY_TERMS = 8
+SNIPPET_WORDS = 24
+# Заголовок важнее текста при ранжировании (веса bm25 по столбцам title, description)
+TITLE_WEIGHT = 10.0
+
+# Границы совпадений в тексте; после экранирования заменяются на <mark>
+MARK_START, MARK_END = "\x02", "\x03"
+
+WORD = re.compile(r"\w+")
+WORD_SPLIT = re.compile(r"(\w+)")
+CYRILLIC = re.compile(r"[а-я]")
+
+SQLITE_SCHEMA = [
+    "CREATE VIEW IF NOT EXISTS news_fts_source AS "
+    "SELECT id, title, description FROM news WHERE status = 'approved'",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS news_fts USING fts5("
+    "title, description, content='news_fts_source', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS news_fts_insert AFTER INSERT ON news "
+    "WHEN new.status = 'approved' BEGIN "
+    "INSERT INTO news_fts(rowid, title, description) VALUES (new.id, new.title, new.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS news_fts_delete AFTER DELETE ON news "
+    "WHEN old.status = 'approved' BEGIN "
+    "INSERT INTO news_fts(news_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS news_fts_update AFTER UPDATE OF title, description, status ON news BEGIN "
+    "INSERT INTO news_fts(news_fts, rowid, title, description) "
+    "SELECT 'delete', old.id, old.title, old.description WHERE old.status = 'approved'; "
+    "INSERT INTO news_fts(rowid, title, description) "
+    "SELECT new.id, new.title, new.description WHERE new.status = 'approved'; "
+    "END",
+]
+
+POSTGRES_SCHEMA = [
+    "ALTER TABLE news ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(description, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_news_search_vector ON news USING GIN (search_vector) "
+    "WHERE status = 'approved'",
+]
+
+SearchHit = namedtuple("SearchHit", ["news", "title", "snippet"])
+
+def create_search_index(connection):
+    """Создает индекс поиска и заполняет его одобренными новостями (для миграции)."""
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        for statement in SQLITE_SCHEMA:
+            connection.execute(text(statement))
+        connection.execute(text("INSERT INTO news_fts(news_fts) VALUES ('rebuild')"))
+    elif dialect == "postgresql":
+        for statement in POSTGRES_SCHEMA:
+            connection.execute(text(statement))
+
+_stemmers = {}
+
+def _stem(word: str) -> str:
+    if snowballstemmer is None:
+        return word
+    language = "russian" if CYRILLIC.search(word) else "english"
+    if language not in _stemmers:
+        _stemmers[language] = snowballstemmer.stemmer(language)
+    return _stemmers[language].stemWord(word)
+
+def query_words(query: str):
+    return WORD.findall(query.casefold().replace("ё", "е"))[:MAX_QUERY_TERMS]
+
+def query_prefixes(query: str):
+    prefixes = []
+    for word in query_words(query):
+        stem = _stem(word)
+        prefixes.append(stem if len(stem) >= MIN_STEM_LENGTH else word)
+    return prefixes
+
+def fts_query(query: str) -> str:
+    """Запрос FTS5 из текста пользователя: нужны все слова, каждое ищется по префиксу основы.
+
+    Слова берутся только из букв и цифр и заключаются в кавычки, поэтому синтаксис
+    FTS5 (OR, NEAR, столбцы) из пользовательского ввода не выполняется.
+    """
+    return " ".join('"%s"*' % prefix for prefix in query_prefixes(query))
+
+def highlight(value: str, prefixes, words: int = None) -> str:
+    """Отмечает слова, начинающиеся с одного из prefixes.
+
+    Если задано words, возвращается фрагмент из стольких слов с наибольшим числом
+    совпадений, как snippet() в FTS5.
+    """
+    parts = WORD_SPLIT.split(value or "")
+    # Слова стоят на нечетных местах, между ними - пробелы и знаки препинания
+    matched = [
+        index for index in range(1, len(parts), 2)
+        if parts[index].casefold().replace("ё", "е").startswith(tuple(prefixes))
+    ]
+    for index in matched:
+        parts[index] = MARK_START + parts[index] + MARK_END
+    total = len(parts) // 2
+    if words is None or total <= words:
+        return "".join(parts)
+
+    best_start, best_count = 0, -1
+    for start in range(total - words + 1):
+        count = sum(1 for index in matched if start <= index // 2 < start + words)
+        if count > best_count:
+            best_start, best_count = start, count
+    first, last = 2 * best_start + 1, 2 * (best_start + words) - 1
+    fragment = "".join(parts[first:last + 1])
+    return ("…" if best_start else "") + fragment + ("…" if best_start + words < total else "")
+
+def _marked(value) -> Markup:
+    """Экранирует текст новости и превращает границы совпадений в <mark>."""
+    return Markup(str(escape(value or "")).replace(MARK_START, "<mark>").replace(MARK_END, "</mark>"))
+
+async def _sqlite_matches(db, query: str, limit: int, offset: int):
+    match = fts_query(query)
+    if not match:
+        return []
+    rows = (await db.execute(text(
+        "SELECT rowid FROM news_fts WHERE news_fts MATCH :match "
+        "ORDER BY bm25(news_fts, :title_weight, 1.0), rowid DESC LIMIT :limit OFFSET :offset"
+    ), {"match": match, "title_weight": TITLE_WEIGHT, "limit": limit, "offset": offset})).all()
+    # Заголовок и фрагмент разметит search_news
+    return [(row[0], None, None) for row in rows]
+
+async def _postgres_matches(db, query: str, limit: int, offset: int):
+    if not query_words(query):
+        return []
+    return (await db.execute(text(
+        "SELECT id, ts_headline('russian', title, q, :title_options), "
+        "ts_headline('russian', description, q, :snippet_options) "
+        "FROM news, websearch_to_tsquery('russian', :query) AS q "
+        "WHERE status = 'approved' AND search_vector @@ q "
+        "ORDER BY ts_rank_cd(search_vector, q) DESC, id DESC LIMIT :limit OFFSET :offset"
+    ), {
+        "query": query, "limit": limit, "offset": offset,
+        "title_options": f"StartSel={MARK_START}, StopSel={MARK_END}, HighlightAll=true",
+        "snippet_options": f"StartSel={MARK_START}, StopSel={MARK_END}, MaxWords={SNIPPET_WORDS}, MinWords=10",
+    })).all()
+
+async def _like_matches(db, query: str, limit: int, offset: int):
+    # Для остальных СУБД: подстрока без ранжирования, от новых к старым
+    words = query_words(query)
+    if not words:
+        return []
+    stmt = select(News.id).where(News.status == "approved")
+    for word in words:
+        stmt = stmt.where(or_(News.title.ilike(f"%{word}%"), News.description.ilike(f"%{word}%")))
+    rows = (await db.execute(
+        stmt.order_by(News.created_at.desc(), News.id.desc()).limit(limit).offset(offset)
+    )).all()
+    return [(row.id, None, None) for row in rows]
+
+async def search_news(db, query: str, page: int = 1, page_size: int = NEWS_SEARCH_PAGE_SIZE):
+    """Одобренные новости по запросу, от наиболее релевантных.
+
+    Возвращает (hits, has_next): на странице не больше page_size результатов, и одна
+    строка запрашивается сверх нее, чтобы узнать, есть ли следующая страница.
+    """
+    page = max(page, 1)
+    dialect = db.bind.dialect.name
+    find = {"sqlite": _sqlite_matches, "postgresql": _postgres_matches}.get(dialect, _like_matches)
+    rows = await find(db, query, page_size + 1, (page - 1) * page_size)
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    if not rows:
+        return [], False
+
+    news = {item.id: item for item in (await db.scalars(
+        select(News).options(joinedload(News.author)).where(News.id.in_([row[0] for row in rows]))
+    )).all()}
+    prefixes = query_prefixes(query)
+    hits = []
+    for news_id, title, snippet in rows:
+        if news_id not in news:
+            continue
+        item = news[news_id]
+        if title is None:
+            title = highlight(item.title, prefixes)
+            snippet = highlight(item.description, prefixes, SNIPPET_WORDS)
+        hits.append(SearchHit(item, _marked(title), _marked(snippet)))
+    return hits, has_next
@@ -0,0 +1,64 @@
+from fastapi import Request
+from fastapi.responses import HTMLResponse, Response
+from auth import TTLCache
+from compression import COMPRESSION_MIN_SIZE, choose_encoding, compress
+from collections import namedtuple
+import hashlib
+import os
+
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "1000"))
+# Сброс кэша виден только своему воркеру, поэтому остальные отдают страницу не дольше TTL
+PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", "30"))  # seconds
+
+# encoded - сжатые варианты тела по Content-Encoding, заполняются при первом запросе каждого
+CachedPage = namedtuple("CachedPage", ["body", "etag", "encoded"])
+
+class PageCache:
+    """Кэш отрисованных страниц, одинаковых для всех пользователей одной роли.
+
+    Сброс страницы увеличивает ее поколение: старые записи перестают находиться
+    и вытесняются по LRU или TTL. Сжатые br/gzip варианты хранятся рядом с телом,
+    поэтому попадание в кэш не сжимает страницу заново: ответ уходит с
+    Content-Encoding, и CompressionMiddleware его не трогает.
+    """
+
+    def __init__(self, maxsize: int, ttl: int):
+        self._pages = TTLCache(maxsize, ttl)
+        self._generations = {}
+
+    def _key(self, page: str, variant: tuple):
+        return (page, self._generations.get(page, 0)) + tuple(variant)
+
+    def get(self, page: str, variant: tuple):
+        return self._pages.get(self._key(page, variant))
+
+    def set(self, page: str, variant: tuple, html: str):
+        body = html.encode("utf-8")
+        cached = CachedPage(body, '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest(), {})
+        self._pages.set(self._key(page, variant), cached)
+        return cached
+
+    def invalidate(self, page: str):
+        self._generations[page] = self._generations.get(page, 0) + 1
+
+    def response(self, request: Request, cached: CachedPage):
+        headers = {"ETag": cached.etag, "Cache-Control": "private, no-cache", "Vary": "Cookie, Accept-Encoding"}
+        encoding = None
+        if len(cached.body) >= COMPRESSION_MIN_SIZE:
+            encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+        if encoding:
+            # Сжатое представление отличается побайтно: ETag слабый, как в compression.py
+            headers["ETag"] = "W/" + cached.etag
+        if_none_match = request.headers.get("if-none-match", "")
+        # Сравнение слабое: клиент мог получить страницу и сжатой, и без сжатия
+        if cached.etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+        if not encoding:
+            return HTMLResponse(cached.body, headers=headers)
+        body = cached.encoded.get(encoding)
+        if body is None:
+            body = cached.encoded[encoding] = compress(cached.body, encoding)
+        headers["Content-Encoding"] = encoding
+        return HTMLResponse(body, headers=headers)
+
+page_cache = PageCache(PAGE_CACHE_SIZE, PAGE_CACHE_TTL)
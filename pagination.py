@@ -0,0 +1,49 @@
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+from datetime import datetime
+import base64
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(created_at: datetime, item_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{item_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, item_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(item_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def clamp_limit(limit: int = None) -> int:
+    if not limit or limit < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(limit, MAX_PAGE_SIZE)
+
+
+async def keyset_page(db, stmt, model, cursor: str = None, limit: int = None):
+    """Страница запроса stmt по ключу (created_at, id) от новых к старым.
+
+    Возвращает (items, next_cursor); next_cursor равен None на последней странице.
+    """
+    limit = clamp_limit(limit)
+    if cursor:
+        created_at, item_id = decode_cursor(cursor)
+        stmt = stmt.where(or_(
+            model.created_at < created_at,
+            and_(model.created_at == created_at, model.id < item_id)
+        ))
+    stmt = stmt.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+    rows = (await db.scalars(stmt)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
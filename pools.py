@@ -0,0 +1,62 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import asyncio
+
+class PoolSaturated(Exception):
+    pass
+
+class BoundedPool:
+    """Пул для CPU-тяжелой работы с ограниченной очередью.
+
+    Когда заняты все воркеры и очередь, run() сразу выбрасывает saturated вместо
+    ожидания. Счетчики меняются только из потока event loop, поэтому блокировки не нужны.
+    """
+
+    def __init__(self, name: str, kind: str, workers: int, max_queue: int, saturated=PoolSaturated):
+        self.name = name
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self.saturated = saturated
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+        return self._executor
+
+    async def run(self, fn, *args):
+        if self.in_flight >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise self.saturated()
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": max(0, self.in_flight - self.workers),
+            "max_in_flight": self.max_in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
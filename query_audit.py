@@ -0,0 +1,196 @@
+"""Учет SQL по запросам для разработки и тестов: сколько запросов, какие повторяются (N+1).
+
+Запросы группируются по отпечатку - тексту SQL без значений параметров и с
+IN-списками любой длины, сведенными к одному виду. Один и тот же отпечаток,
+выполненный за запрос много раз, обычно означает N+1: связь, которая подгружается
+в цикле вместо joinedload/selectinload. Для каждого повтора запоминается место,
+откуда он пришел: строка шаблона или файла проекта.
+
+В режиме разработки (SQL_AUDIT=1) ответы получают заголовки X-SQL-Queries и
+X-SQL-Repeated, а запросы сверх бюджета или с повторами выводятся в лог. В тестах
+бюджет маршрута проверяет query_budget():
+
+    with query_budget(10, max_repeats=1):
+        await client.get("/teacher")
+"""
+from sqlalchemy import event
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import Counter
+import os
+import re
+import sys
+
+try:
+    import greenlet
+except ImportError:  # без greenlet нет и async-движка SQLAlchemy
+    greenlet = None
+
+SQL_AUDIT = os.getenv("SQL_AUDIT", "0") == "1"
+# Больше запросов на один HTTP-запрос - повод посмотреть на маршрут
+SQL_AUDIT_MAX_QUERIES = int(os.getenv("SQL_AUDIT_MAX_QUERIES", "20"))
+# Столько выполнений одного отпечатка за запрос считается повтором
+SQL_AUDIT_REPEAT_THRESHOLD = int(os.getenv("SQL_AUDIT_REPEAT_THRESHOLD", "3"))
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+PLACEHOLDER = re.compile(r"%\([^)]+\)s|%s|\$\d+|(?<![:\w]):\w+|\?")
+VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+SPACES = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """SQL без значений: литералы и параметры заменены на ?, списки (?, ?, ...) - на (...)."""
+    statement = STRING_LITERAL.sub("?", statement)
+    statement = NUMBER_LITERAL.sub("?", statement)
+    statement = PLACEHOLDER.sub("?", statement)
+    statement = VALUE_LIST.sub("(...)", statement)
+    return SPACES.sub(" ", statement).strip()
+
+
+def _caller_frames():
+    frame = sys._getframe(2)
+    while frame is not None:
+        yield frame
+        frame = frame.f_back
+    # Запрос async-сессии выполняется в отдельном greenlet; обработчик, который его
+    # вызвал, ждет в родительском greenlet
+    current = greenlet.getcurrent() if greenlet is not None else None
+    while current is not None and current.parent is not None:
+        current = current.parent
+        frame = current.gr_frame
+        while frame is not None:
+            yield frame
+            frame = frame.f_back
+
+
+def query_origin() -> str:
+    """Ближайшее к запросу место в проекте: строка шаблона или файла с функцией."""
+    for frame in _caller_frames():
+        template = frame.f_globals.get("__jinja_template__")
+        if template is not None:
+            return f"templates/{template.name}:{template.get_corresponding_lineno(frame.f_lineno)}"
+        filename = frame.f_code.co_filename
+        # Пакеты из виртуального окружения внутри проекта тоже пропускаются
+        if filename.startswith(PROJECT_DIR) and filename != __file__ and "-packages" not in filename:
+            return f"{os.path.relpath(filename, PROJECT_DIR)}:{frame.f_lineno} ({frame.f_code.co_name})"
+    return "?"
+
+
+class QueryLog:
+    """SQL, выполненные за один HTTP-запрос или внутри query_budget()."""
+
+    def __init__(self):
+        self.statements = []
+        self.fingerprints = Counter()
+        self.origins = {}
+
+    def record(self, statement: str):
+        key = fingerprint(statement)
+        self.statements.append(statement)
+        self.fingerprints[key] += 1
+        self.origins.setdefault(key, set()).add(query_origin())
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def repeated(self, threshold: int = SQL_AUDIT_REPEAT_THRESHOLD):
+        """[(отпечаток, сколько раз, места вызова)] для отпечатков, выполненных не меньше threshold раз."""
+        return [
+            (key, times, sorted(self.origins[key]))
+            for key, times in self.fingerprints.most_common() if times >= threshold
+        ]
+
+    def report(self, threshold: int = SQL_AUDIT_REPEAT_THRESHOLD) -> str:
+        lines = [f"{self.count} SQL-запросов, различных: {len(self.fingerprints)}"]
+        for key, times, origins in self.repeated(threshold):
+            lines.append(f"  x{times} {key}" if times > 1 else f"  {key}")
+            lines.append(f"       из {', '.join(origins)}")
+        return "\n".join(lines)
+
+
+_request_log: ContextVar = ContextVar("query_log", default=None)
+# Журналы вложенных query_budget() текущего контекста
+_budget_logs: ContextVar = ContextVar("query_budget_logs", default=())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    log = _request_log.get()
+    if log is not None:
+        log.record(statement)
+    for budget_log in _budget_logs.get():
+        budget_log.record(statement)
+
+
+def audit_engine(engine):
+    """Подключает учет SQL к синхронному движку (для async - engine.sync_engine)."""
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(max_queries: int = None, max_repeats: int = None):
+    """Проверяет, что за блок выполнено не больше max_queries SQL и ни один отпечаток - больше max_repeats раз.
+
+    Учитываются только запросы текущего контекста: приложение нужно вызывать в той же
+    задаче, через httpx.AsyncClient(transport=httpx.ASGITransport(app)), как в tests/.
+    Возвращает журнал блока для собственных проверок.
+    """
+    log = QueryLog()
+    token = _budget_logs.set(_budget_logs.get() + (log,))
+    try:
+        yield log
+    finally:
+        _budget_logs.reset(token)
+
+    problems = []
+    # В отчет попадают все запросы при превышении бюджета и только повторы - при N+1
+    threshold = max_repeats + 1 if max_repeats is not None else SQL_AUDIT_REPEAT_THRESHOLD
+    if max_queries is not None and log.count > max_queries:
+        problems.append(f"выполнено {log.count} SQL-запросов при бюджете {max_queries}")
+        threshold = 1
+    if max_repeats is not None and log.repeated(max_repeats + 1):
+        problems.append(f"запрос повторяется больше {max_repeats} раз (N+1?)")
+    if problems:
+        raise QueryBudgetExceeded("; ".join(problems) + "\n" + log.report(threshold))
+
+
+class QueryAuditMiddleware:
+    """Считает SQL каждого HTTP-запроса, добавляет заголовки X-SQL-* и пишет в лог превышения."""
+
+    def __init__(self, app, max_queries: int = SQL_AUDIT_MAX_QUERIES, threshold: int = SQL_AUDIT_REPEAT_THRESHOLD):
+        self.app = app
+        self.max_queries = max_queries
+        self.threshold = threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        log = QueryLog()
+        token = _request_log.set(log)
+
+        async def send_audited(message):
+            # Потоковые ответы выполняют часть SQL после заголовков: итог - в логе
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-sql-queries", str(log.count).encode()))
+                headers.append((b"x-sql-repeated", str(len(log.repeated(self.threshold))).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_audited)
+        finally:
+            _request_log.reset(token)
+            if log.count > self.max_queries:
+                print(f"SQL {scope['method']} {scope['path']} сверх бюджета {self.max_queries}: {log.report(1)}")
+            elif log.repeated(self.threshold):
+                print(f"SQL {scope['method']} {scope['path']}: {log.report(self.threshold)}")
@@ -0,0 +1,197 @@
+from bisect import bisect_left, insort
+from sqlalchemy import select, text
+from models import Schedule
+import asyncio
+import os
+import time
+
+# Через столько секунд индекс перечитывается из БД: так в него попадают пары других воркеров
+SCHEDULE_INDEX_TTL = int(os.getenv("SCHEDULE_INDEX_TTL", "60"))  # seconds
+
+
+def resource_key(value):
+    if not value or not value.strip():
+        return None
+    return " ".join(value.split()).casefold()
+
+
+class IntervalIndex:
+    """Занятые интервалы по ключу (ресурс, день), отсортированные по началу.
+
+    Интервалы могут пересекаться: старая база принимала любые пары, а миграция
+    schedule_slots переносит их как есть. Поэтому для каждого ключа хранится длина
+    самого длинного интервала: пересечься с [start, end) может только интервал,
+    который начинается позже start - longest, и просмотр идет влево от bisect
+    только до этой границы.
+    """
+
+    def __init__(self):
+        self._slots = {}
+        self._longest = {}
+
+    def find_conflict(self, key, day: int, start: int, end: int):
+        slot = self._slots.get((key, day))
+        if not slot:
+            return None
+        earliest = start - self._longest[(key, day)]
+        position = bisect_left(slot, (end,)) - 1
+        while position >= 0 and slot[position][0] > earliest:
+            if slot[position][1] > start:
+                return slot[position][2]
+            position -= 1
+        return None
+
+    def add(self, key, day: int, start: int, end: int, entry_id):
+        insort(self._slots.setdefault((key, day), []), (start, end, entry_id))
+        # При удалении длина не уменьшается: граница просмотра остается верной, только шире
+        self._longest[(key, day)] = max(self._longest.get((key, day), 0), end - start)
+
+    def remove(self, key, day: int, start: int, entry_id):
+        slot = self._slots.get((key, day), [])
+        position = bisect_left(slot, (start,))
+        while position < len(slot) and slot[position][0] == start:
+            if slot[position][2] == entry_id:
+                del slot[position]
+                return
+            position += 1
+
+    def keys(self):
+        return {key for key, day in self._slots}
+
+    def clear(self):
+        self._slots.clear()
+        self._longest.clear()
+
+
+def find_overlaps(rows):
+    """Пары, которые пересекаются с предыдущими по аудитории или преподавателю.
+
+    rows - (id, day_index, start_minute, end_minute, room, teacher_name); возвращает
+    список (id, id пересекающейся пары, "room" или "teacher").
+    """
+    rooms, teachers = IntervalIndex(), IntervalIndex()
+    overlaps = []
+    for schedule_id, day, start, end, room, teacher_name in rows:
+        for kind, index, key in (("room", rooms, resource_key(room)), ("teacher", teachers, resource_key(teacher_name))):
+            if not key:
+                continue
+            conflict = index.find_conflict(key, day, start, end)
+            if conflict is not None:
+                overlaps.append((schedule_id, conflict, kind))
+            index.add(key, day, start, end, schedule_id)
+    return overlaps
+
+
+class ScheduleIndex:
+    """Индекс расписания по аудиториям и преподавателям в памяти процесса.
+
+    Загружается из БД при первом обращении и обновляется обработчиками добавления
+    и удаления пар. Изменения других воркеров попадают сюда при перезагрузке раз в
+    SCHEDULE_INDEX_TTL секунд, поэтому при добавлении пары окончательно решает
+    проверка в БД (find_conflicts_in_db), а индекс отвечает на поиск свободных аудиторий.
+    """
+
+    def __init__(self):
+        self.rooms = IntervalIndex()
+        self.teachers = IntervalIndex()
+        self.room_names = {}
+        self.loaded_at = None
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> bool:
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < SCHEDULE_INDEX_TTL
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    async def ensure_loaded(self, db):
+        if self._fresh():
+            return
+        async with self._lock:
+            if self._fresh():
+                return
+            rows = (await db.execute(
+                select(
+                    Schedule.id, Schedule.day_index, Schedule.start_minute,
+                    Schedule.end_minute, Schedule.room, Schedule.teacher_name
+                ).where(Schedule.day_index.is_not(None))
+            )).all()
+            self.rooms.clear()
+            self.teachers.clear()
+            self.room_names.clear()
+            for row in rows:
+                self.add(*row)
+            self.loaded_at = time.monotonic()
+
+    def conflicts(self, day: int, start: int, end: int, room, teacher_name):
+        """Возвращает id пар, с которыми пересекается новая пара по аудитории и преподавателю."""
+        result = {}
+        room_key = resource_key(room)
+        if room_key:
+            conflict = self.rooms.find_conflict(room_key, day, start, end)
+            if conflict is not None:
+                result["room"] = conflict
+        teacher_key = resource_key(teacher_name)
+        if teacher_key:
+            conflict = self.teachers.find_conflict(teacher_key, day, start, end)
+            if conflict is not None:
+                result["teacher"] = conflict
+        return result
+
+    def add(self, schedule_id, day: int, start: int, end: int, room, teacher_name):
+        room_key = resource_key(room)
+        if room_key:
+            self.rooms.add(room_key, day, start, end, schedule_id)
+            self.room_names.setdefault(room_key, room.strip())
+        teacher_key = resource_key(teacher_name)
+        if teacher_key:
+            self.teachers.add(teacher_key, day, start, end, schedule_id)
+
+    def remove(self, schedule_id, day: int, start: int, room, teacher_name):
+        room_key = resource_key(room)
+        if room_key:
+            self.rooms.remove(room_key, day, start, schedule_id)
+        teacher_key = resource_key(teacher_name)
+        if teacher_key:
+            self.teachers.remove(teacher_key, day, start, schedule_id)
+
+    def free_rooms(self, day: int, start: int, end: int):
+        return sorted(
+            self.room_names[room_key] for room_key in self.rooms.keys()
+            if self.rooms.find_conflict(room_key, day, start, end) is None
+        )
+
+
+async def lock_schedules(db):
+    """Сериализует добавление пар до конца транзакции.
+
+    В SQLite запись и так выполняет один писатель, и блокировку берет сам INSERT;
+    в PostgreSQL две транзакции не видят незакоммиченные пары друг друга, поэтому
+    берется транзакционная advisory-блокировка.
+    """
+    if db.bind.dialect.name == "postgresql":
+        await db.execute(text("SELECT pg_advisory_xact_lock(hashtext('schedules'))"))
+
+
+async def find_conflicts_in_db(db, schedule):
+    """Пересечения пары с другими парами в БД: {"room": id, "teacher": id}, как ScheduleIndex.conflicts."""
+    rows = (await db.execute(
+        select(Schedule.id, Schedule.room, Schedule.teacher_name).where(
+            Schedule.day_index == schedule.day_index,
+            Schedule.start_minute < schedule.end_minute,
+            Schedule.end_minute > schedule.start_minute,
+            Schedule.id != schedule.id
+        ).order_by(Schedule.start_minute, Schedule.id)
+    )).all()
+    result = {}
+    room_key = resource_key(schedule.room)
+    teacher_key = resource_key(schedule.teacher_name)
+    for schedule_id, room, teacher_name in rows:
+        if room_key and "room" not in result and resource_key(room) == room_key:
+            result["room"] = schedule_id
+        if teacher_key and "teacher" not in result and resource_key(teacher_name) == teacher_key:
+            result["teacher"] = schedule_id
+    return result
+
+
+schedule_index = ScheduleIndex()
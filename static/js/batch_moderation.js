@@ -0,0 +1,72 @@
+// Пакетная модерация: статус отмеченных записей меняется одним запросом без перезагрузки страницы
+(function () {
+    const form = document.querySelector("[data-batch-form]");
+    if (!form) return;
+    const all = document.querySelector("[data-batch-all]");
+    const counter = form.querySelector("[data-batch-count]");
+    const result = form.querySelector("[data-batch-result]");
+    const buttons = form.querySelectorAll("button[name=status]");
+
+    function items() {
+        return Array.from(document.querySelectorAll("[data-batch-item]"));
+    }
+
+    function refresh() {
+        const total = items().length;
+        const checked = items().filter((item) => item.checked).length;
+        if (counter) counter.textContent = checked;
+        buttons.forEach((button) => (button.disabled = !checked));
+        if (all) {
+            all.checked = total > 0 && checked === total;
+            all.indeterminate = checked > 0 && checked < total;
+        }
+    }
+
+    function summary(results) {
+        const counts = { updated: 0, unchanged: 0, not_found: 0 };
+        results.forEach((item) => (counts[item.result] += 1));
+        let text = "Изменено: " + counts.updated;
+        if (counts.unchanged) text += ", уже в этом статусе: " + counts.unchanged;
+        if (counts.not_found) text += ", не найдено: " + counts.not_found;
+        return text;
+    }
+
+    document.addEventListener("change", (event) => {
+        if (event.target.matches("[data-batch-item]")) refresh();
+    });
+    if (all) {
+        all.addEventListener("change", () => {
+            items().forEach((item) => (item.checked = all.checked));
+            refresh();
+        });
+    }
+
+    form.addEventListener("submit", async (event) => {
+        event.preventDefault();
+        const data = new FormData(form);
+        data.set("status", event.submitter.value);
+        buttons.forEach((button) => (button.disabled = true));
+        try {
+            const response = await fetch(form.action, {
+                method: "POST",
+                body: data,
+                headers: { Accept: "application/json" },
+                credentials: "same-origin",
+            });
+            if (!response.ok) {
+                if (result) result.textContent = "Не удалось изменить статус (код " + response.status + ")";
+                return;
+            }
+            const body = await response.json();
+            const present = body.results.filter((item) => item.result !== "not_found").map((item) => item.id);
+            if (window.liveUpdates) window.liveUpdates.apply(present, body.status);
+            else window.location.reload();
+            items().forEach((item) => (item.checked = false));
+            if (result) result.textContent = summary(body.results);
+        } finally {
+            refresh();
+        }
+    });
+
+    refresh();
+})();
@@ -0,0 +1,74 @@
+// Статусы заявок, документов и новостей обновляются на месте по событиям сервера (/events)
+(function () {
+    const STATUSES = {
+        pending: ["Ожидает", "bg-warning"],
+        approved: ["Одобрено", "bg-success"],
+        rejected: ["Отклонено", "bg-danger"],
+        completed: ["Выполнено", "bg-primary"],
+        issued: ["Выдано", "bg-primary"],
+    };
+
+    const root = document.querySelector("[data-live-updates]");
+    if (!root) return;
+
+    const notice = root.querySelector("[data-live-notice]");
+    const noticeText = notice ? notice.querySelector("[data-live-notice-text]") : null;
+    // Страница со списком одного статуса (очередь модерации, фильтр): записи с другим статусом убираются
+    const keepStatus = root.dataset.keepStatus;
+    const owner = root.dataset.owner;
+    let added = 0;
+
+    function showNotice(text) {
+        if (!notice) return;
+        if (noticeText) noticeText.textContent = text;
+        notice.classList.remove("d-none");
+    }
+
+    function setStatus(row, status) {
+        const select = row.querySelector("select[name=status]");
+        if (select) select.value = status;
+        const cell = row.querySelector("[data-live-status]");
+        const [label, color] = STATUSES[status] || [status, "bg-secondary"];
+        if (!cell) return;
+        const badge = document.createElement("span");
+        badge.className = "badge " + color;
+        badge.textContent = label;
+        cell.replaceChildren(badge);
+    }
+
+    // Применяет новый статус к записям ids; возвращает, сколько из них есть на странице
+    function apply(ids, status) {
+        let found = 0;
+        for (const id of ids) {
+            const row = root.querySelector('[data-live-id="' + id + '"]');
+            if (!row) continue;
+            found += 1;
+            if (keepStatus && status !== keepStatus) row.remove();
+            else setStatus(row, status);
+        }
+        return found;
+    }
+
+    function onEvent(event) {
+        const data = JSON.parse(event.data);
+        if (owner && String(data.owner_id) !== owner) return;
+        const ids = data.ids || [data.id];
+        const found = apply(ids, data.status);
+        if (data.status === "pending" && found < ids.length && (!keepStatus || keepStatus === "pending")) {
+            added += ids.length - found;
+            showNotice((root.dataset.addedText || "Новых записей") + ": " + added);
+        }
+    }
+
+    window.liveUpdates = { apply };
+
+    if (!window.EventSource) return;
+    const params = new URLSearchParams({ since: root.dataset.since || "" });
+    const source = new EventSource("/events?" + params);
+    for (const type of root.dataset.events.split(",")) {
+        source.addEventListener(type, onEvent);
+    }
+    // Пропущенные события сервер уже не помнит (перезапуск или долгий обрыв)
+    source.addEventListener("resync", () => showNotice("Данные могли измениться"));
+    window.addEventListener("pagehide", () => source.close());
+})();
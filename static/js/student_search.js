@@ -0,0 +1,103 @@
+// Выбор студента с подсказками: варианты запрашиваются у сервера по мере ввода
+(function () {
+    const DELAY_MS = 200;
+
+    function setup(container) {
+        const input = container.querySelector("[data-search-input]");
+        const value = container.querySelector("[data-search-value]");
+        const results = container.querySelector("[data-search-results]");
+        const form = container.closest("form");
+        const submit = form ? form.querySelector("[type=submit]") : null;
+        let timer = null;
+        let controller = null;
+        let active = -1;
+
+        function select(item) {
+            input.value = item.full_name || item.username;
+            value.value = item.id;
+            if (submit) submit.disabled = false;
+            results.innerHTML = "";
+        }
+
+        function highlight(index) {
+            const buttons = results.querySelectorAll("button:not([disabled])");
+            buttons.forEach((button, i) => button.classList.toggle("active", i === index));
+            active = index;
+        }
+
+        function render(items) {
+            results.innerHTML = "";
+            active = -1;
+            if (!items.length) {
+                const empty = document.createElement("div");
+                empty.className = "list-group-item text-muted";
+                empty.textContent = "Никого не найдено";
+                results.appendChild(empty);
+                return;
+            }
+            for (const item of items) {
+                const button = document.createElement("button");
+                button.type = "button";
+                button.className = "list-group-item list-group-item-action";
+                button.textContent = item.full_name || item.username;
+                const login = document.createElement("small");
+                login.className = "text-muted ms-2";
+                login.textContent = item.in_group ? item.username + " · уже в группе" : item.username;
+                button.appendChild(login);
+                button.disabled = item.in_group;
+                button.addEventListener("click", () => select(item));
+                results.appendChild(button);
+            }
+        }
+
+        async function search(query) {
+            if (controller) controller.abort();
+            controller = new AbortController();
+            const params = new URLSearchParams({ q: query, role: "student" });
+            if (container.dataset.groupId) params.set("group_id", container.dataset.groupId);
+            try {
+                const response = await fetch(container.dataset.url + "?" + params, {
+                    signal: controller.signal,
+                    credentials: "same-origin",
+                });
+                if (response.ok) render((await response.json()).items);
+            } catch (error) {
+                if (error.name !== "AbortError") throw error;
+            }
+        }
+
+        input.addEventListener("input", () => {
+            value.value = "";
+            if (submit) submit.disabled = true;
+            clearTimeout(timer);
+            const query = input.value.trim();
+            if (!query) {
+                if (controller) controller.abort();
+                results.innerHTML = "";
+                return;
+            }
+            timer = setTimeout(() => search(query), DELAY_MS);
+        });
+
+        input.addEventListener("keydown", (event) => {
+            const buttons = results.querySelectorAll("button:not([disabled])");
+            if (!buttons.length) return;
+            if (event.key === "ArrowDown") {
+                event.preventDefault();
+                highlight((active + 1) % buttons.length);
+            } else if (event.key === "ArrowUp") {
+                event.preventDefault();
+                highlight((active - 1 + buttons.length) % buttons.length);
+            } else if (event.key === "Enter" && active >= 0) {
+                event.preventDefault();
+                buttons[active].click();
+            } else if (event.key === "Escape") {
+                results.innerHTML = "";
+            }
+        });
+
+        if (submit) submit.disabled = !value.value;
+    }
+
+    document.querySelectorAll("[data-student-search]").forEach(setup);
+})();
@@ -0,0 +1,219 @@
+"""Раздача /static и /uploads с долгим кэшированием.
+
+Ссылки на статику строятся через static_url() в шаблонах: к пути добавляется
+отпечаток содержимого, и такой URL кэшируется браузером навсегда (immutable).
+Сжатые копии CSS/JS собираются заранее:
+
+    python static_assets.py          # создать .gz и .br рядом с файлами static/
+"""
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers, QueryParams
+from starlette.exceptions import HTTPException
+from starlette.responses import Response, FileResponse
+from mimetypes import guess_type
+import anyio
+import gzip
+import hashlib
+import os
+import re
+import stat
+
+try:
+    import brotli
+except ImportError:  # без brotli отдаются только gzip-копии
+    brotli = None
+
+STATIC_DIR = "static"
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".svg", ".json", ".map", ".txt"}
+# Порядок предпочтения сжатых копий
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDATE = "no-cache"
+
+# Имена, начинающиеся с sha256 содержимого (см. storage.py и images.py), никогда не меняются
+CONTENT_ADDRESSED = re.compile(r"^([0-9a-f]{64})(-\d+)?\.[a-z0-9]+$")
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+_fingerprints = {}
+
+def fingerprint(path: str, directory: str = STATIC_DIR):
+    """Короткий хэш содержимого файла; пересчитывается, только если файл изменился."""
+    full_path = os.path.join(directory, path)
+    try:
+        stat_result = os.stat(full_path)
+    except OSError:
+        return None
+    key = (stat_result.st_mtime_ns, stat_result.st_size)
+    cached = _fingerprints.get(full_path)
+    if cached and cached[0] == key:
+        return cached[1]
+    with open(full_path, "rb") as f:
+        value = hashlib.blake2b(f.read(), digest_size=6).hexdigest()
+    _fingerprints[full_path] = (key, value)
+    return value
+
+def static_url(path: str) -> str:
+    """URL файла из static/ с отпечатком содержимого (глобальная функция шаблонов)."""
+    path = path.lstrip("/")
+    version = fingerprint(path)
+    return f"/static/{path}?v={version}" if version else f"/static/{path}"
+
+def accepted_encodings(headers: Headers) -> set:
+    encodings = set()
+    for item in headers.get("accept-encoding", "").split(","):
+        name, _, params = item.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        encodings.add(name.strip().lower())
+    return encodings
+
+def _etag_matches(header: str, etag: str) -> bool:
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+class FileRangeResponse(Response):
+    """Ответ 206 с одним диапазоном байтов файла."""
+    chunk_size = 64 * 1024
+
+    def __init__(self, path: str, start: int, end: int, size: int, headers: dict, media_type: str, method: str):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.status_code = 206
+        self.media_type = media_type
+        self.background = None
+        self.send_header_only = method == "HEAD"
+        self.init_headers({
+            **headers,
+            "Content-Range": f"bytes {start}-{end}/{size}",
+            "Content-Length": str(end - start + 1),
+        })
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if self.send_header_only:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        remaining = self.end - self.start + 1
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles с политикой кэширования, сжатыми копиями и запросами диапазонов.
+
+    Immutable получают URL с актуальным отпечатком (?v=) и файлы с хэшем содержимого
+    в имени; у последних ETag - сам хэш. Остальные файлы браузер перепроверяет по ETag.
+    """
+
+    def __init__(self, *args, precompressed: bool = False, ranges: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.precompressed = precompressed
+        self.ranges = ranges
+
+    def _cache_policy(self, path: str, stat_result, scope):
+        name = os.path.basename(path)
+        match = CONTENT_ADDRESSED.match(name)
+        if match:
+            return CACHE_IMMUTABLE, '"%s%s"' % (match.group(1), match.group(2) or "")
+        etag = '"%s"' % hashlib.md5(
+            f"{stat_result.st_mtime_ns}-{stat_result.st_size}".encode(), usedforsecurity=False
+        ).hexdigest()
+        version = QueryParams(scope.get("query_string", b"")).get("v")
+        if version and self.directory and version == fingerprint(path, str(self.directory)):
+            return CACHE_IMMUTABLE, etag
+        return CACHE_REVALIDATE, etag
+
+    async def get_response(self, path: str, scope) -> Response:
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=405)
+        full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path)
+        if not (stat_result and stat.S_ISREG(stat_result.st_mode)):
+            return await super().get_response(path, scope)
+
+        request_headers = Headers(scope=scope)
+        cache_control, etag = self._cache_policy(path, stat_result, scope)
+        headers = {"Cache-Control": cache_control}
+        media_type = guess_type(path)[0] or "application/octet-stream"
+        encoding = None
+
+        if self.precompressed and os.path.splitext(path)[1] in COMPRESSIBLE_EXTENSIONS:
+            headers["Vary"] = "Accept-Encoding"
+            accepted = accepted_encodings(request_headers)
+            for name, suffix in ENCODINGS:
+                if name not in accepted:
+                    continue
+                variant_path, variant_stat = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+                # Копия старше исходника осталась от прошлой сборки и не отдается
+                if (
+                    variant_stat and stat.S_ISREG(variant_stat.st_mode)
+                    and variant_stat.st_mtime >= stat_result.st_mtime
+                ):
+                    full_path, stat_result, encoding = variant_path, variant_stat, name
+                    headers["Content-Encoding"] = name
+                    # У каждого представления свой ETag
+                    etag = etag[:-1] + f"-{name}" + '"'
+                    break
+        headers["ETag"] = etag
+
+        if _etag_matches(request_headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers=headers)
+
+        if self.ranges and encoding is None:
+            headers["Accept-Ranges"] = "bytes"
+            range_header = request_headers.get("range")
+            if_range = request_headers.get("if-range")
+            if range_header and (if_range is None or if_range == etag):
+                size = stat_result.st_size
+                match = RANGE.match(range_header.strip())
+                if match and match.group(1) + match.group(2):
+                    first, last = match.groups()
+                    if first:
+                        start, end = int(first), min(int(last), size - 1) if last else size - 1
+                    else:
+                        start, end = max(0, size - int(last)), size - 1
+                    if start > end or start >= size:
+                        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+                    return FileRangeResponse(full_path, start, end, size, headers, media_type, scope["method"])
+                # Несколько диапазонов не поддерживаются: отдается файл целиком
+
+        return FileResponse(
+            full_path, stat_result=stat_result, method=scope["method"], headers=headers, media_type=media_type
+        )
+
+def build(directory: str = STATIC_DIR):
+    """Создает .gz (и .br, если установлен brotli) для текстовой статики."""
+    written = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if os.path.splitext(name)[1] not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                variants[".br"] = brotli.compress(data, quality=11)
+            for suffix, compressed in variants.items():
+                if len(compressed) >= len(data):
+                    if os.path.exists(path + suffix):
+                        os.remove(path + suffix)
+                    continue
+                with open(path + suffix, "wb") as f:
+                    f.write(compressed)
+                written += 1
+                print(f"  {path + suffix}: {len(data)} -> {len(compressed)} байт")
+    if brotli is None:
+        print("brotli не установлен: созданы только .gz")
+    print(f"Сжатых копий: {written}")
+
+if __name__ == "__main__":
+    build()
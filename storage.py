@@ -0,0 +1,121 @@
+from fastapi import UploadFile, Request
+from starlette.concurrency import run_in_threadpool
+from collections import namedtuple
+import hashlib
+import os
+import tempfile
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Запас на остальные поля формы при проверке Content-Length
+FORM_OVERHEAD_BYTES = 1024 * 1024
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+EXTENSION_ALIASES = {".jpeg": ".jpg"}
+# Сигнатуры начала файла: содержимое должно соответствовать расширению
+SIGNATURES = {
+    ".jpg": lambda head: head.startswith(b"\xff\xd8\xff"),
+    ".png": lambda head: head.startswith(b"\x89PNG\r\n\x1a\n"),
+    ".gif": lambda head: head.startswith((b"GIF87a", b"GIF89a")),
+    ".webp": lambda head: head.startswith(b"RIFF") and head[8:12] == b"WEBP",
+}
+
+OBJECTS_DIR = os.path.join(UPLOAD_DIR, "objects")
+TMP_DIR = os.path.join(UPLOAD_DIR, "tmp")
+
+# url - адрес объекта в /uploads, digest - sha256 содержимого (его же содержит имя файла)
+StoredUpload = namedtuple("StoredUpload", ["url", "digest"])
+
+class UploadTooLarge(Exception):
+    pass
+
+class UnsupportedUpload(Exception):
+    pass
+
+def has_file(upload: UploadFile) -> bool:
+    """Браузер отправляет пустую часть без имени, если файл не выбран."""
+    return upload is not None and bool(upload.filename)
+
+def object_url(digest: str, extension: str) -> str:
+    return f"/uploads/objects/{digest[:2]}/{digest}{extension}"
+
+def url_to_path(url: str) -> str:
+    """Путь на диске для URL вида /uploads/..."""
+    if not url.startswith("/uploads/"):
+        raise ValueError(f"Не загрузка: {url}")
+    relative = os.path.normpath(url[len("/uploads/"):])
+    if relative.startswith(".."):
+        raise ValueError(f"Не загрузка: {url}")
+    return os.path.join(UPLOAD_DIR, relative)
+
+def _store(source, extension: str) -> StoredUpload:
+    source.seek(0)
+    os.makedirs(TMP_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=TMP_DIR, suffix=extension)
+    try:
+        with os.fdopen(fd, "wb") as target:
+            while chunk := source.read(UPLOAD_CHUNK_SIZE):
+                # Файл другого типа с подходящим расширением отклоняется по первой части
+                if size == 0 and extension in SIGNATURES and not SIGNATURES[extension](chunk):
+                    raise UnsupportedUpload(extension)
+                size += len(chunk)
+                if size > UPLOAD_MAX_BYTES:
+                    raise UploadTooLarge()
+                digest.update(chunk)
+                target.write(chunk)
+            if size == 0 and extension in SIGNATURES:
+                raise UnsupportedUpload(extension)
+            target.flush()
+            os.fsync(target.fileno())
+        hexdigest = digest.hexdigest()
+        object_dir = os.path.join(OBJECTS_DIR, hexdigest[:2])
+        object_path = os.path.join(object_dir, hexdigest + extension)
+        if os.path.exists(object_path):
+            # Такой файл уже загружали: содержимое совпадает, второй копии не нужно
+            os.remove(tmp_path)
+        else:
+            os.makedirs(object_dir, exist_ok=True)
+            os.replace(tmp_path, object_path)
+        return StoredUpload(object_url(hexdigest, extension), hexdigest)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+async def save_upload(upload: UploadFile, extensions=IMAGE_EXTENSIONS) -> StoredUpload:
+    """Сохраняет загрузку по хэшу содержимого и возвращает ее URL и хэш.
+
+    Файл читается и хэшируется по частям в пуле потоков, пишется во временный файл
+    и переименовывается атомарно, поэтому одновременные загрузки не мешают друг другу,
+    а одинаковые файлы хранятся один раз.
+    """
+    extension = os.path.splitext(upload.filename or "")[1].lower()
+    if extension not in extensions:
+        raise UnsupportedUpload(extension)
+    if upload.size is not None and upload.size > UPLOAD_MAX_BYTES:
+        raise UploadTooLarge()
+    return await run_in_threadpool(_store, upload.file, EXTENSION_ALIASES.get(extension, extension))
+
+class UploadLimitMiddleware:
+    """Отклоняет multipart-запросы, чей Content-Length заведомо больше лимита, до чтения тела."""
+
+    def __init__(self, app, on_too_large):
+        self.app = app
+        self.on_too_large = on_too_large
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST":
+            headers = dict(scope["headers"])
+            content_type = headers.get(b"content-type", b"")
+            content_length = headers.get(b"content-length", b"")
+            if (
+                content_type.startswith(b"multipart/form-data") and content_length.isdigit()
+                and int(content_length) > UPLOAD_MAX_BYTES + FORM_OVERHEAD_BYTES
+            ):
+                response = await self.on_too_large(Request(scope), UploadTooLarge())
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
@@ -0,0 +1,52 @@
+"""Шаблоны Jinja2 с постоянным кэшем байткода.
+
+Скомпилированные шаблоны сохраняются в TEMPLATE_CACHE_DIR, и новый процесс
+загружает их оттуда вместо компиляции. При старте приложения все шаблоны
+загружаются заранее, чтобы первый запрос не платил за компиляцию. Кэш можно
+заполнить при сборке образа:
+
+    python templating.py
+"""
+from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
+import os
+
+TEMPLATES_DIR = "templates"
+# Каталог вне templates/: иначе файлы кэша попадут в список шаблонов
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", ".jinja_cache")
+# 0 - не проверять mtime шаблона при каждом обращении (шаблоны меняются только с новым образом)
+TEMPLATES_AUTO_RELOAD = os.getenv("TEMPLATES_AUTO_RELOAD", "1") == "1"
+
+def bytecode_cache(directory: str = TEMPLATE_CACHE_DIR):
+    """Кэш байткода или None, если каталог недоступен для записи (например, образ только для чтения)."""
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError:
+        return None
+    if not os.access(directory, os.W_OK):
+        return None
+    return FileSystemBytecodeCache(directory)
+
+def create_templates(directory: str = TEMPLATES_DIR) -> Jinja2Templates:
+    return Jinja2Templates(
+        directory=directory,
+        bytecode_cache=bytecode_cache(),
+        auto_reload=TEMPLATES_AUTO_RELOAD,
+    )
+
+def precompile(templates: Jinja2Templates) -> int:
+    """Загружает все шаблоны в кэш окружения; отсутствующие в кэше байткода компилируются и сохраняются."""
+    env = templates.env
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+if __name__ == "__main__":
+    import time
+    started = time.perf_counter()
+    templates = create_templates()
+    if templates.env.bytecode_cache is None:
+        print(f"Каталог {TEMPLATE_CACHE_DIR} недоступен для записи: кэш байткода не создан")
+    count = precompile(templates)
+    print(f"Шаблонов скомпилировано: {count} за {(time.perf_counter() - started) * 1000:.0f} мс")
@@ -0,0 +1,77 @@
+"""Общие фикстуры тестов: небольшая заполненная база и клиенты по ролям.
+
+Приложение вызывается в той же задаче через httpx.ASGITransport, как в bench.py,
+поэтому query_budget() видит SQL, выполненные обработчиками.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench import CREDENTIALS, build_database, configure_environment
+
+# Небольшой объем: на нескольких записях N+1 уже видно по числу повторов
+TEST_SCALE = {
+    "students": 60, "teachers": 3, "groups": 3, "weeks": 2,
+    "news": 30, "documents": 30, "dormitory": 30,
+}
+
+WORKDIR = tempfile.mkdtemp(prefix="max_univer_tests_")
+DB_PATH = os.path.join(WORKDIR, "test.db")
+# Модули приложения читают окружение при импорте
+configure_environment(DB_PATH)
+os.environ["UPLOAD_DIR"] = os.path.join(WORKDIR, "uploads")
+os.environ["TEMPLATE_CACHE_DIR"] = os.path.join(WORKDIR, "jinja_cache")
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+async def app():
+    build_database(DB_PATH, TEST_SCALE, seed=1)
+    from main import app
+    await app.router.startup()
+    yield app
+    await app.router.shutdown()
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+async def clients(app):
+    """Клиенты страниц (cookie после /login) и API (Bearer) для каждой роли: clients["teacher"], clients["api:teacher"]."""
+    import httpx
+    transport = httpx.ASGITransport(app=app)
+    clients = {}
+    for role, (username, password) in CREDENTIALS.items():
+        client = httpx.AsyncClient(transport=transport, base_url="http://testserver")
+        response = await client.post("/login", data={"username": username, "password": password})
+        assert response.status_code == 303, f"не удалось войти как {username}"
+        clients[role] = client
+        response = await client.post("/api/v1/token", data={"username": username, "password": password})
+        clients[f"api:{role}"] = httpx.AsyncClient(
+            transport=transport, base_url="http://testserver",
+            headers={"Authorization": f"Bearer {response.json()['access_token']}"}
+        )
+    yield clients
+    for client in clients.values():
+        await client.aclose()
+
+
+@pytest.fixture(scope="session")
+def group_id(app):
+    """Группа преподавателя teacher_1 (клиент clients["teacher"])."""
+    from sqlalchemy import text
+    from database import engine
+    with engine.connect() as connection:
+        return connection.execute(text(
+            "SELECT groups.id FROM groups JOIN users ON users.id = groups.teacher_id "
+            "WHERE users.username = 'teacher_1' ORDER BY groups.id"
+        )).scalar()
@@ -0,0 +1,70 @@
+"""Отметка посещаемости группы: повторная отправка того же занятия не создает дублей."""
+import asyncio
+
+import pytest
+from sqlalchemy import text
+
+pytestmark = pytest.mark.anyio
+
+
+def _attendance_state(group_id, date):
+    from database import engine
+    with engine.connect() as connection:
+        per_student = connection.execute(text(
+            "SELECT student_id, COUNT(*), MAX(present) FROM attendance_records "
+            "WHERE group_id = :group_id AND date = :date GROUP BY student_id"
+        ), {"group_id": group_id, "date": date}).all()
+        sessions, presents = connection.execute(text(
+            "SELECT sessions, presents FROM group_attendance_summaries WHERE group_id = :group_id"
+        ), {"group_id": group_id}).one()
+        student_ids = connection.execute(text(
+            "SELECT student_id FROM group_students WHERE group_id = :group_id ORDER BY student_id"
+        ), {"group_id": group_id}).scalars().all()
+    return {row[0]: (row[1], row[2]) for row in per_student}, sessions, presents, student_ids
+
+
+async def test_resubmitted_roster_keeps_one_mark_per_student(clients, group_id):
+    _, sessions_before, _, student_ids = _attendance_state(group_id, "2031-02-03 09:00:00.000000")
+    form = {
+        "date": "2031-02-03 09:00",
+        "student_ids": [str(student_id) for student_id in student_ids],
+        **{f"present_{student_id}": "on" for student_id in student_ids[::2]},
+    }
+    url = f"/teacher/group/{group_id}/attendance"
+
+    # Двойной клик: одинаковые запросы одновременно, затем еще раз тот же список
+    responses = await asyncio.gather(*(clients["teacher"].post(url, data=form) for _ in range(3)))
+    responses.append(await clients["teacher"].post(url, data=form))
+    assert [response.status_code for response in responses] == [303] * 4
+
+    marks, sessions, presents, _ = _attendance_state(group_id, "2031-02-03 09:00:00.000000")
+    assert sorted(marks) == student_ids
+    assert all(count == 1 for count, _ in marks.values())
+    assert sessions == sessions_before + len(student_ids)
+
+    # Изменение отметок обновляет записи и сводку, не добавляя занятий
+    form.update({f"present_{student_id}": "on" for student_id in student_ids})
+    assert (await clients["teacher"].post(url, data=form)).status_code == 303
+    marks, sessions_after, presents_after, _ = _attendance_state(group_id, "2031-02-03 09:00:00.000000")
+    assert all(marks[student_id] == (1, 1) for student_id in student_ids)
+    assert sessions_after == sessions
+    assert presents_after == presents + len(student_ids[1::2])
+
+
+async def test_student_sees_attendance_only_of_own_groups(clients):
+    from database import engine
+    with engine.connect() as connection:
+        memberships = dict(connection.execute(text(
+            "SELECT groups.id, COUNT(users.id) FROM groups "
+            "LEFT JOIN group_students ON group_students.group_id = groups.id "
+            "LEFT JOIN users ON users.id = group_students.student_id AND users.username = 'student_1' "
+            "GROUP BY groups.id"
+        )).all())
+    own = [group_id for group_id, count in memberships.items() if count]
+    other = [group_id for group_id, count in memberships.items() if not count]
+    assert own and other
+
+    response = await clients["api:student"].get(f"/api/v1/groups/{own[0]}/attendance")
+    assert response.status_code == 200
+    response = await clients["api:student"].get(f"/api/v1/groups/{other[0]}/attendance")
+    assert response.status_code == 403
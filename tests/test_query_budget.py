@@ -0,0 +1,56 @@
+"""Бюджеты SQL-запросов горячих маршрутов.
+
+Бюджет - число запросов на холодный (без кэша страниц) запрос маршрута; ни один
+запрос не должен повторяться (max_repeats=1), иначе где-то появилась подгрузка
+связи в цикле. Если маршрут стал делать больше запросов намеренно, бюджет
+меняется вместе с кодом.
+"""
+import pytest
+
+from page_cache import page_cache
+from query_audit import QueryBudgetExceeded, query_budget
+
+pytestmark = pytest.mark.anyio
+
+# (клиент, маршрут, бюджет)
+BUDGETS = [
+    ("student", "/schedule", 1),
+    ("student", "/news", 1),
+    ("student", "/news/feed", 1),
+    ("student", "/dormitory", 1),
+    ("student", "/documents", 1),
+    ("teacher", "/teacher", 2),
+    ("teacher", "/teacher/group/{group_id}", 4),
+    ("deanery", "/dormitory/admin", 1),
+    ("deanery", "/documents/admin", 1),
+    ("deanery", "/news/admin", 1),
+    ("deanery", "/attendance/report", 1),
+    ("api:student", "/api/v1/schedule", 1),
+    ("api:student", "/api/v1/news", 1),
+    ("api:student", "/api/v1/documents", 1),
+    ("api:student", "/api/v1/dormitory-requests", 1),
+    ("api:teacher", "/api/v1/groups", 2),
+    ("api:teacher", "/api/v1/groups/{group_id}/attendance", 2),
+    ("api:deanery", "/api/v1/documents", 1),
+    ("api:deanery", "/api/v1/dormitory-requests", 1),
+    ("api:deanery", "/api/v1/groups?fields=name,students", 2),
+]
+
+
+@pytest.mark.parametrize("client, path, budget", BUDGETS)
+async def test_route_query_budget(clients, group_id, client, path, budget):
+    page_cache.invalidate("schedule")
+    page_cache.invalidate("news")
+    with query_budget(budget, max_repeats=1):
+        # Потоковые страницы (очереди деканата) загружают данные до первого байта;
+        # ASGITransport возвращает ответ, когда тело отрисовано целиком, так что
+        # шаблон, обратившийся к незагруженной связи, тоже попал бы в бюджет
+        response = await clients[client].get(path.format(group_id=group_id))
+    assert response.status_code == 200
+    assert response.content
+
+
+async def test_budget_counts_handler_queries(clients):
+    with pytest.raises(QueryBudgetExceeded):
+        with query_budget(0):
+            await clients["teacher"].get("/teacher")